@@ -1,33 +1,177 @@
+import os
+import asyncio
 import time
 import atexit
 import getpass
-import requests  # install the package via "pip install requests"
 from collections import defaultdict
 import rdflib
 import pandas as pd
 import json
 import csv
-import re
 
-from pos_extraction import *
-from ner_extraction import *
-from intent_decider import *
+from pos_extraction import POS_extractor, load_pos_model
+from ner_extraction import NER_extractor
+from intent_decider import IntentionDecider
+from crowd_index import load_crowd_index
+from kg_snapshot import graph_source_path, load_graph
+from embedding_store import EmbeddingStore
+from vector_search import load_vector_index
+from label_service import LabelService
+from movie_metadata import MovieMetadata
+from recommendation_index import RecommendationIndex
+from image_index import ImageIndex
+from relation_vocabulary import NOUN_MAPPER, RelationVocabulary
+from relation_lexicon import RelationLexicon
+from micro_batcher import MicroBatcher
+from annotation import Annotator
+from intent_matcher import GENRE_DICT, IntentMatcher
+from response_cache import ResponseCache
+from startup import StartupOrchestrator, Lazy
+from startup_profiler import PROFILER
+from speakeasy_client import SpeakeasyClient
+from worker_pool import ResponseWorkerPool
+from scheduler import DeadlineScheduler, DeadlineExpired
 
 # url of the speakeasy server
 url = 'https://speakeasy.ifi.uzh.ch'
 listen_freq = 3
+# keep-alive connections to the server (also the number of concurrent requests)
+speakeasy_pool_size = 32
+# 'cascade' runs ner_large only when ner_base is not confident, 'both' always runs both
+ner_mode = 'cascade'
+# int8 dynamic quantized taggers and sentence encoder, experimental: leave off until
+# python model_quantization.py shows their F1 and latency against the fp32 models
+quantize_models = False
+# NER / POS tagging of messages from all rooms is batched:
+# a batch runs when batch_max_size messages wait or batch_max_wait seconds passed
+batch_max_size = 16
+batch_max_wait = 0.05
+# answers of repeated questions are served from a cache (persisted in response_cache_path)
+# entries expire after response_cache_ttl seconds, recommendations are never cached
+response_cache_size = 1024
+response_cache_ttl = 3600
+response_cache_path = 'Data/response_cache.pkl'
+# optional list of entity mentions (one per line) encoded into the mention cache on start
+mention_warm_path = 'Data/mention_warm.txt'
+# > 0 answers messages in that many worker processes (each loads the models,
+# the memory mapped graph, embeddings and indexes are shared), 0 answers in the bot process
+# needs the compiled KG snapshot (python kg_snapshot.py), without it the bot answers in process
+response_workers = 0
+# threads loading the models and data on start
+startup_workers = 6
+# per resource wall / CPU time and memory delta of the start, written to profile_path
+# (set startup_workers = 1 for exact per resource memory), tracemalloc top N lines if > 0
+profile_startup = False
+profile_path = 'startup_profile.json'
+profile_tracemalloc_top = 0
+# pending messages are answered earliest due first: at the end of their room or
+# answer_target_latency seconds after they arrived; messages that cannot be answered in full
+# before their room ends skip the embedding search, those that cannot be answered at all are dropped
+answer_target_latency = 30
+# seconds per unit of the remainingTime of a room
+remaining_time_unit = 0.001
+# scheduler queue depth, wait times and shed / shortened answers, response cache, entity linking
+# and mention cache hit rates and tagging batch sizes, written every metrics_freq seconds
+# (response workers write theirs to metrics_<pid>.json next to it)
+metrics_path = 'metrics.json'
+metrics_freq = 60
+
+
+# cached artifacts of the pipeline, each (re)built on its first load
+
+def load_crowd():
+    # crowd answers aggregated per (entity, relation), rebuilt when the crowd data changes
+    return load_crowd_index('Data/crowd_data/clean_crowd_data.csv', 'Data/crowd_data/rates.json',
+                            'Data/crowd_data/crowd_index.pkl')
+
+
+def load_film_properties():
+    # film properties were retrieved from wikidata itself
+    # no code exists for creating this
+    return set(pd.read_csv('Data/Film Properties.csv')['res'])
+
+
+def load_relation_lexicon(film_properties):
+    # verb / noun surface forms -> film properties, prebuilt with python relation_lexicon.py
+    return RelationLexicon(NOUN_MAPPER, film_properties, 'Data/relation_lexicon.pkl', ['Data/Film Properties.csv'])
+
+
+def graph_sources():
+    # tables derived from the graph are cached in Data/kg_tables and rebuilt when the graph changes
+    return [graph_source_path('Data/14_graph.nt', 'Data/kg_snapshot')]
+
+
+def load_label_service(graph):
+    return LabelService(graph, 'Data/kg_tables/labels.pkl', graph_sources())
+
+
+def load_movie_metadata(graph):
+    return MovieMetadata(graph, 'Data/kg_tables/movie_metadata.pkl', graph_sources())
+
+
+def load_recommendation_index(graph, label_service):
+    return RecommendationIndex(graph, label_service, 'Data/kg_tables/recommendation_index.pkl', graph_sources())
+
+
+def load_relation_vocab(graph):
+    return RelationVocabulary(graph, 'Data/kg_tables/relation_labels.pkl', graph_sources())
+
+
+def load_images():
+    return ImageIndex('Data/images.json', 'Data/images_index.pkl')
+
+
+def prepare_artifacts():
+    '''
+    builds the cached artifacts that are missing or stale before the response workers start,
+    so the workers only read them; the graph is only loaded if a table has to be rebuilt
+    '''
+    graph = Lazy(lambda: load_graph('Data/14_graph.nt', 'Data/kg_snapshot'), 'graph')
+    film_properties = load_film_properties()
+    load_crowd()
+    load_relation_lexicon(film_properties)
+    load_movie_metadata(graph)
+    load_recommendation_index(graph, load_label_service(graph))
+    load_relation_vocab(graph)
+    load_images()
+
+
+def write_metrics(path, metrics):
+    try:
+        with open(path, 'w') as f:
+            json.dump(dict(metrics, time=time.strftime("%H:%M:%S, %d-%m-%Y", time.localtime())), f, indent=2)
+    except OSError as e:
+        print('\t\t Error: failed to save the metrics: {}'.format(e))
+
 
+def read_ids(path):
+    '''
+    URI -> embedding row and row -> URI maps of an ids.del file
+    '''
+    with open(path, 'r') as ifile:
+        uri2id = {rdflib.term.URIRef(uri): int(idx) for idx, uri in csv.reader(ifile, delimiter='\t')}
+    return uri2id, {v: k for k, v in uri2id.items()}
 
-class StefosBot:
-    def __init__(self, username, password):
-        self.agent_details = self.login(username, password)
-        self.session_token = self.agent_details['sessionToken']
-        self.chat_state = defaultdict(lambda: {'messages': defaultdict(dict), 'initiated': False, 'my_alias': None})
 
-        self.ner_extractor = NER_extractor()
-        self.pos_extractor = POS_extractor()
-        self.intent_decider = IntentionDecider()
+class StefosPipeline:
+    '''
+    the models and data and the pipeline from a message to its answer
+    runs in the bot process or in each response worker process
+    '''
+
+    def __init__(self, profile=False, warm=True, batch_size=batch_max_size, metrics_path=None):
+        # where the pipeline writes its metrics every metrics_freq seconds (None: the bot writes them)
+        self.metrics_path = metrics_path
+        self.metrics_time = time.time()
+
+        if profile:
+            PROFILER.enable(profile_tracemalloc_top)
 
+        # shared read only, memory mapped embedding matrices
+        self.embedding_store = EmbeddingStore()
+
+        self.WDT = rdflib.Namespace('http://www.wikidata.org/prop/direct/')
+        self.WD = rdflib.Namespace('http://www.wikidata.org/entity/')
 
         # URI IDS for PERson and Movies (MISC) e.g. film, animated film etc...
         self.category2URIID = {
@@ -37,87 +181,165 @@ class StefosBot:
         }
 
         #genres and their synonyms that will be used for matching
-        self.genre_dict = {
-            'drama film': {'words': ['drama'], 'id': 'Q130232'},
-            'documentary film': {'words': ['documentary', 'factual'], 'id': 'Q93204'},
-            'comedy film': {'words': ['funny', 'comedy', 'comedic'], 'id': 'Q157443'},
-            'crime film': {'words': ['crime'], 'id': 'Q959790'},
-            'action film': {'words': ['action'], 'id': 'Q188473'},
-            'romance film': {'words': ['romantic', 'romance'], 'id': 'Q1054574'},
-            'horror film': {'words': ['horror', 'scary'], 'id': 'Q200092'},
-            'adventure film': {'words': ['adventure'], 'id': 'Q319221'},
-            'neo-noir': {'words': ['neo-noir', 'new-black', 'neo noir', 'new black'], 'id': 'Q2421031'},
-            'science fiction': {'words': ['science fiction', 'SF', 'scifi', 'sci Fi', 'fantasy'
-                                          'sci-Fi', 'science-fiction', 'sci fi', 'sciencefiction'], 'id': 'Q24925'},
-            'thriller film': {'words': ['thriller', 'suspense'], 'id': 'Q2484376'},
-            'animated film': {'words': ['animated', 'animation', 'cartoon'], 'id': 'Q202866'},
+        self.genre_dict = GENRE_DICT
 
-        }
+        # rewrites, phrase intents and genres compiled into single pass matchers
+        self.intent_matcher = IntentMatcher(self.genre_dict)
 
-        # film properties were retrieved from wikidata itself
-        # no code exists for creating this
-        print('Loading film properties...')
-        self.film_properties = set(pd.read_csv('Data/Film Properties.csv')['res'])
+        # independent resources load concurrently, the rest as soon as what they need is there
+        self.startup = StartupOrchestrator(startup_workers)
+        self.startup.add('ner_extractor', lambda: NER_extractor(self.embedding_store, mode=ner_mode,
+                                                                quantize=quantize_models))
+        self.startup.add('pos_model', lambda: load_pos_model(quantize_models))
 
-        RDFS = rdflib.namespace.RDFS
-        self.WDT = rdflib.Namespace('http://www.wikidata.org/prop/direct/')
-        self.WD = rdflib.Namespace('http://www.wikidata.org/entity/')
+        self.startup.add('crowd_index', load_crowd)
+        self.startup.add('film_properties', load_film_properties)
+        self.startup.add('relation_lexicon', load_relation_lexicon, deps=['film_properties'])
+
+        # compiled snapshot if available (python kg_snapshot.py), rdflib parse otherwise
+        self.startup.add('graph', lambda: load_graph('Data/14_graph.nt', 'Data/kg_snapshot'))
 
-        print('Loading Graph...')
-        self.graph = rdflib.Graph().parse('Data/14_graph.nt', format='turtle')
+        self.startup.add('entity_emb',
+                         lambda: self.embedding_store.load('entity', 'Data/ddis-graph-embeddings/entity_embeds.npy'))
+        self.startup.add('relation_emb',
+                         lambda: self.embedding_store.load('relation', 'Data/ddis-graph-embeddings/relation_embeds.npy'))
 
-        print('Loading Embeddings...')
-        self.entity_emb = np.load('Data/ddis-graph-embeddings/entity_embeds.npy')
-        self.relation_emb = np.load('Data/ddis-graph-embeddings/relation_embeds.npy')
+        # approximate index if built (python vector_search.py ...), exact search otherwise
+        self.startup.add('entity_index',
+                         lambda entity_emb: load_vector_index(entity_emb, 'Data/ddis-graph-embeddings/entity_ivf'),
+                         deps=['entity_emb'])
 
         # load the dictionaries
-        with open('Data/ddis-graph-embeddings/entity_ids.del', 'r') as ifile:
-            self.ent2id = {rdflib.term.URIRef(ent): int(idx) for idx, ent in csv.reader(ifile, delimiter='\t')}
-            self.id2ent = {v: k for k, v in self.ent2id.items()}
-        with open('Data/ddis-graph-embeddings/relation_ids.del', 'r') as ifile:
-            self.rel2id = {rdflib.term.URIRef(rel): int(idx) for idx, rel in csv.reader(ifile, delimiter='\t')}
-            self.id2rel = {v: k for k, v in self.rel2id.items()}
-
-        self.ent2lbl = {ent: str(lbl) for ent, lbl in self.graph.subject_objects(RDFS.label)}
+        self.startup.add('entity_ids', lambda: read_ids('Data/ddis-graph-embeddings/entity_ids.del'))
+        self.startup.add('relation_ids', lambda: read_ids('Data/ddis-graph-embeddings/relation_ids.del'))
+
+        self.startup.add('label_service', load_label_service, deps=['graph'])
+        self.startup.add('movie_metadata', load_movie_metadata, deps=['graph'])
+        self.startup.add('recommendation_index', load_recommendation_index, deps=['graph', 'label_service'])
+        self.startup.add('relation_vocab', load_relation_vocab, deps=['graph'])
+
+        # the extractor and the decider get the shared tables they answer with
+        self.startup.add('pos_extractor',
+                         lambda pos_model, relation_vocab, relation_lexicon:
+                         POS_extractor(pos_model, relation_vocab, relation_lexicon, self.intent_matcher),
+                         deps=['pos_model', 'relation_vocab', 'relation_lexicon'])
+        self.startup.add('intent_decider',
+                         lambda *tables: IntentionDecider(*tables, self.intent_matcher),
+                         deps=['crowd_index', 'entity_index', 'label_service', 'movie_metadata',
+                               'recommendation_index'])
+
+        # not needed to answer, runs while the bot already listens
+        if warm:
+            self.startup.add('mention_warm', self.warm_mentions, deps=['ner_extractor'], critical=False)
+
+        # images are only needed for picture questions, loaded on the first one
+        self.images = Lazy(load_images, 'images')
+
+        print('Loading models and data...')
+        seconds = self.startup.wait_ready()
+
+        self.ner_extractor = self.startup.get('ner_extractor')
+        self.pos_extractor = self.startup.get('pos_extractor')
+        self.intent_decider = self.startup.get('intent_decider')
+        # one tokenization per message shared by all taggers
+        self.annotator = Annotator(self.ner_extractor, self.pos_extractor)
+
+        self.film_properties = self.startup.get('film_properties')
+        self.graph = self.startup.get('graph')
+        self.entity_emb = self.startup.get('entity_emb')
+        self.relation_emb = self.startup.get('relation_emb')
+        self.embedding_store.print_memory_report()
+
+        self.ent2id, self.id2ent = self.startup.get('entity_ids')
+        self.rel2id, self.id2rel = self.startup.get('relation_ids')
+
+        self.relation_lexicon = self.startup.get('relation_lexicon')
+        self.label_service = self.startup.get('label_service')
+        self.movie_metadata = self.startup.get('movie_metadata')
+        self.recommendation_index = self.startup.get('recommendation_index')
+        self.relation_vocab = self.startup.get('relation_vocab')
+        self.ent2lbl = self.label_service.ent2lbl
         self.lbl2ent = {lbl: ent for ent, lbl in self.ent2lbl.items()}
 
-        print('Loading images...')
-        with open("Data/images.json", "r") as f:
-            self.images = json.load(f)
+        # one batched tagging pass for the messages of all rooms,
+        # rooms are answered concurrently so their messages can meet in a batch
+        self.tagging_batcher = MicroBatcher(self.tag_batch, batch_size, batch_max_wait, 'tagging')
+
+        print('Models and data loaded ({:.1f}s)'.format(seconds))
+        if profile:
+            PROFILER.print_report(PROFILER.save(profile_path))
+
+    def warm_mentions(self, ner_extractor):
+        '''
+        encodes the mentions of mention_warm_path into the mention cache
+        '''
+        if not os.path.exists(mention_warm_path):
+            return 0
+        with open(mention_warm_path) as f:
+            warmed = ner_extractor.entity_linker.warm([line.strip() for line in f if line.strip()])
+        print('Encoded {} new mentions into the mention cache'.format(warmed))
+        return warmed
 
-        print('All Set up and ready to roll!!')
 
-        atexit.register(self.logout)
 
+    def rewrite_message(self, message):
+        '''
+        various remappings for certain relations that can interfere with other
+        relations that consist of the same words
+        '''
 
+        return self.intent_matcher.rewrite(message)
 
-    def create_response(self, message):
+    def tag_batch(self, messages):
+        '''
+        NER and POS tagging of several (rewritten) messages in one batch
+        returns an annotated document per message
+        '''
+
+        return self.annotator.annotate_batch(messages)
+
+    def create_response(self, message, fast=False):
         '''
         method that recieves the message and responds with an answer
         takes the message and takes it through the whole pipeline
+        fast gives a shorter answer (no embedding search) when the room is about to end
         '''
 
-        # various remappings for certain relations that can interfere with other
-        # relations that consist of the same words
-        message = re.sub('executive producer', 'showrunner', message)
-        message = re.sub('production designer', 'designer', message)
-        message = re.sub('costume designer', 'costume', message)
-        message = re.sub('box office', 'box', message)
-        message = re.sub('narrative location', 'nlocation', message)
-        message = re.sub('filming location', 'flocation', message)
-        message = re.sub('production company', 'company', message)
+        message = self.rewrite_message(message)
+
+        # tagging goes through the batcher, batched with messages of other rooms
+        doc = self.tagging_batcher(message)
 
-        # extract NER
-        entities,  Owords = self.ner_extractor.get_entities(message)
+        response = self.answer(doc, fast)
 
-        # extract Relations through POS
-        pos = self.pos_extractor.get_pos(message)
+        if self.metrics_path and time.time() - self.metrics_time >= metrics_freq:
+            self.metrics_time = time.time()
+            write_metrics(self.metrics_path, self.metrics())
+        return response
+
+    def metrics(self):
+        '''
+        hit rates of the entity linking paths and of the mention cache,
+        NER cascade escalations and tagging batch sizes
+        '''
+        linker = self.ner_extractor.entity_linker
+        mention_cache = self.ner_extractor.mention_cache
+        return {'entity_linking': {'counts': dict(linker.counts), 'hit_rates': linker.hit_rates()},
+                'mention_cache': dict(mention_cache.stats, hit_rate=mention_cache.hit_rate(), size=len(mention_cache)),
+                'ner_cascade': self.ner_extractor.cascade_stats(),
+                'tagging_batches': dict(self.tagging_batcher.stats,
+                                        mean_batch_size=self.tagging_batcher.mean_batch_size())}
+
+    def answer(self, doc, fast=False):
+        '''
+        rest of the pipeline after tagging: entity linking, relations and the answer
+        '''
 
         # Get entities URI IDs
-        ent = self.ner_extractor.getEntities_URIIDs(self.graph, entities, self.WDT, self.WD, self.category2URIID)
+        ent = self.ner_extractor.getEntities_URIIDs(self.graph, doc.entities, self.WDT, self.WD, self.category2URIID)
 
         # Get Relations URI IDs
-        rel = self.pos_extractor.get_relations(pos, Owords, self.graph, self.WDT, self.film_properties)
+        rel = self.pos_extractor.get_relations(doc.pos, doc.Owords, self.graph, self.WDT, self.film_properties)
 
         print()
         print(ent)
@@ -127,11 +349,11 @@ class StefosBot:
         # Pass entities and relations to decide answer
         # considering relations as intentions
         final_answer = self.intent_decider.decider(self.graph, self.WD, self.WDT,
-                                                   ent, rel, Owords, self.entity_emb,
+                                                   ent, rel, doc.Owords, self.entity_emb,
                                                    self.ent2id, self.ent2lbl,
                                                    self.id2ent, self.relation_emb,
                                                    self.rel2id, self.images,
-                                                   self.genre_dict, self.category2URIID)
+                                                   self.genre_dict, self.category2URIID, fast)
 
         # if no answer found
         if final_answer == '':
@@ -145,68 +367,275 @@ class StefosBot:
             return final_answer
 
 
+def response_worker():
+    '''
+    builds the pipeline of a response worker process, returns its responder
+    a worker answers one message at a time, so it does not wait for tagging batches
+    '''
+    path = '{}_{}.json'.format(os.path.splitext(metrics_path)[0], os.getpid())
+    return StefosPipeline(warm=False, batch_size=1, metrics_path=path).create_response
+
+
+class StefosBot:
+    def __init__(self, username, password, pipeline=None):
+        '''
+        pipeline: an already built pipeline (create_response(message, fast)) instead of
+        the one of the configuration, e.g. a stub to test the polling
+        '''
+        # last_ordinal / last_message: cursor of the incremental polling
+        self.chat_state = defaultdict(lambda: {'messages': defaultdict(dict), 'initiated': False, 'my_alias': None,
+                                               'last_ordinal': -1, 'last_message': None})
+        # whether the server returns the messages after since (True) or from since on (False),
+        # corrected on the first poll that shows otherwise
+        self.since_exclusive = False
+
+        # recommendation check of the response cache
+        self.intent_matcher = IntentMatcher(GENRE_DICT)
+
+        # cached answers are dropped when the graph, the crowd data (answers and approval rates)
+        # or the images change
+        self.response_cache = ResponseCache(response_cache_size, response_cache_ttl, response_cache_path,
+                                            graph_sources() +
+                                            ['Data/crowd_data/clean_crowd_data.csv', 'Data/crowd_data/rates.json',
+                                             'Data/images.json'])
+
+        n_workers = response_workers
+        if n_workers and graph_sources()[0] == 'Data/14_graph.nt':
+            # without the memory mapped snapshot every worker would parse and hold the whole graph
+            print('\t\t Error: no KG snapshot in Data/kg_snapshot, answering in the bot process '
+                  '(run python kg_snapshot.py once to use response workers)')
+            n_workers = 0
+
+        if pipeline is not None:
+            self.pipeline = pipeline
+            self.respond = pipeline.create_response
+        elif n_workers:
+            # the workers only read the cached artifacts, missing or stale ones are built here first
+            prepare_artifacts()
+
+            # worker processes with their own pipeline, the large artifacts are memory mapped and shared
+            print('Starting {} response workers...'.format(n_workers))
+            self.pipeline = ResponseWorkerPool(response_worker, n_workers)
+            self.pipeline.wait_ready()
+            self.respond = self.pipeline.respond
+            atexit.register(self.pipeline.close)
+        else:
+            self.pipeline = StefosPipeline(profile=profile_startup)
+            self.respond = self.pipeline.create_response
 
+        # answers wait for the pipeline here, the rooms closest to their end first
+        self.scheduler = DeadlineScheduler(max(batch_max_size, 2 * n_workers), answer_target_latency)
+
+        print('All Set up and ready to roll!!')
+
+        # only log in once the bot can answer
+        self.client = SpeakeasyClient(url, speakeasy_pool_size)
+        self.agent_details = self.login(username, password)
+        self.session_token = self.agent_details['sessionToken']
+
+        atexit.register(self.logout)
+        atexit.register(self.response_cache.save)
+        atexit.register(self.save_metrics)
+
+    def cacheable(self, message):
+        # recommendations are sampled, a repeated request should get another movie
+        return 'recommendation' not in [r['relation'] for r in self.intent_matcher.relations(message)]
+
+    def cached_response(self, message):
+        '''
+        answer of a message from the response cache, None if there is none
+        '''
+        return self.response_cache.get(message) if self.cacheable(message) else None
+
+    def create_response(self, message, fast=False):
+        '''
+        answer of a message from the pipeline, stored in the response cache
+        shortened (fast) answers are not cached
+        '''
+
+        response = self.respond(message, fast)
+        if not fast and self.cacheable(message):
+            self.response_cache.put(message, response)
+        return response
 
     def listen(self):
+        asyncio.run(self.listen_async())
+
+    async def listen_async(self):
+        '''
+        polls all chatrooms concurrently every listen_freq seconds
+        new messages go to a queue per room that is answered in order off the event loop,
+        so a slow answer never holds up the polling or the other rooms
+        '''
+        self.room_queues = {}
+        self.room_posts = {}
+        metrics_time = time.time()
         while True:
-            # check for all chatrooms
-            current_rooms = self.check_rooms(session_token=self.session_token)['rooms']
-            for room in current_rooms:
+            try:
+                # check for all chatrooms
+                current_rooms = (await self.client.async_rooms(self.session_token))['rooms']
                 # ignore finished conversations
-                if room['remainingTime'] > 0:
-                    room_id = room['uid']
-                    if not self.chat_state[room_id]['initiated']:
-                        # send a welcome message and get the alias of the agent in the chatroom
-                        greeting_message = ("Hi, I am Stefos bot, a rebellious teenager that responds with minimum effort. "
-                                            "I don't respond to thank yous or greetings. Just tell me what you want about "
-                                            "MOVIES and MOVIES only. Another thing, I'm Case sensitive and i don't respond "
-                                            "to spelling mistakes.")
-                        self.post_message(room_id=room_id, session_token=self.session_token, message=greeting_message)
-                        self.chat_state[room_id]['initiated'] = True
-                        self.chat_state[room_id]['my_alias'] = room['alias']
+                await asyncio.gather(*[self.poll_room(room) for room in current_rooms if room['remainingTime'] > 0])
+            except Exception as e:
+                print('\t\t Error: failed to poll the chatrooms: {}'.format(e))
+            if time.time() - metrics_time >= metrics_freq:
+                metrics_time = time.time()
+                self.save_metrics()
+            await asyncio.sleep(listen_freq)
+
+    def save_metrics(self):
+        '''
+        writes the scheduler, response cache and (in process) pipeline metrics to metrics_path
+        '''
+        metrics = {'scheduler': self.scheduler.metrics(),
+                   'response_cache': dict(self.response_cache.stats, hit_rate=self.response_cache.hit_rate())}
+        if isinstance(self.pipeline, StefosPipeline):
+            metrics['pipeline'] = self.pipeline.metrics()
+        write_metrics(metrics_path, metrics)
 
-                    # check for all messages
-                    all_messages = self.check_room_state(room_id=room_id, since=0, session_token=self.session_token)['messages']
+    async def poll_room(self, room):
+        '''
+        greets a new room and queues its new messages
+        '''
+        room_id = room['uid']
+        # the messages of the room have to be answered before then
+        self.chat_state[room_id]['deadline'] = time.time() + room['remainingTime'] * remaining_time_unit
+        if not self.chat_state[room_id]['initiated']:
+            # send a welcome message and get the alias of the agent in the chatroom
+            greeting_message = ("Hi, I am Stefos bot, a rebellious teenager that responds with minimum effort. "
+                                "I don't respond to thank yous or greetings. Just tell me what you want about "
+                                "MOVIES and MOVIES only. Another thing, I'm Case sensitive and i don't respond "
+                                "to spelling mistakes.")
+            self.post_in_order(room_id, greeting_message)
+            self.chat_state[room_id]['initiated'] = True
+            self.chat_state[room_id]['my_alias'] = room['alias']
+
+        # only the messages since the last seen one
+        all_messages = await self.poll_new_messages(room_id)
+
+        # you can also use ["reactions"] to get the reactions of the messages: STAR, THUMBS_UP, THUMBS_DOWN
+
+        for message in all_messages:
+            if message['authorAlias'] != self.chat_state[room_id]['my_alias']:
+
+                # check if the message is new
+                if message['ordinal'] not in self.chat_state[room_id]['messages']:
+                    self.chat_state[room_id]['messages'][message['ordinal']] = message
+                    print('\t- Chatroom {} - new message #{}: \'{}\' - {}'.format(room_id, message['ordinal'], message['message'], self.get_time()))
+
+                    self.post_in_order(room_id, "...")
+                    if room_id not in self.room_queues:
+                        self.room_queues[room_id] = asyncio.Queue()
+                        asyncio.ensure_future(self.answer_room(room_id, self.room_queues[room_id]))
+                    self.room_queues[room_id].put_nowait(message)
+
+    async def poll_new_messages(self, room_id):
+        '''
+        messages of a room after its cursor (the last seen message)
+        the cursor message itself is requested again to check the server still has it,
+        if it is gone or another message took its ordinal the server was reset:
+        the full history is fetched and the room starts over
+        '''
+        state = self.chat_state[room_id]
+        anchor = state['last_ordinal']
 
-                    # you can also use ["reactions"] to get the reactions of the messages: STAR, THUMBS_UP, THUMBS_DOWN
+        if anchor < 0:
+            messages = await self.full_history(room_id)
+        else:
+            since = anchor - 1 if self.since_exclusive else anchor
+            messages = (await self.client.async_room_state(room_id, since, self.session_token))['messages']
+
+            if not self._same_message(self._find_ordinal(messages, anchor), state['last_message']):
+                messages = await self.full_history(room_id)
+                if self._same_message(self._find_ordinal(messages, anchor), state['last_message']):
+                    # the cursor message is there, since works the other way round
+                    self.since_exclusive = not self.since_exclusive
+                else:
+                    print('\t- Chatroom {} - message history was reset, starting over - {}'.format(room_id, self.get_time()))
+                    state['messages'].clear()
+                    state['last_ordinal'], state['last_message'] = -1, None
+                    anchor = -1
+
+        new = [m for m in messages if m['ordinal'] > anchor]
+        if new:
+            state['last_message'] = max(new, key=lambda m: m['ordinal'])
+            state['last_ordinal'] = state['last_message']['ordinal']
+        return new
+
+    async def full_history(self, room_id):
+        '''
+        all messages of a room, since -1 is before the first ordinal whether the server
+        returns the messages from since on or after since
+        '''
+        return (await self.client.async_room_state(room_id, -1, self.session_token))['messages']
 
-                    for message in all_messages:
-                        if message['authorAlias'] != self.chat_state[room_id]['my_alias']:
+    @staticmethod
+    def _find_ordinal(messages, ordinal):
+        for m in messages:
+            if m['ordinal'] == ordinal:
+                return m
+        return None
 
-                            # check if the message is new
-                            if message['ordinal'] not in self.chat_state[room_id]['messages']:
-                                self.chat_state[room_id]['messages'][message['ordinal']] = message
-                                print('\t- Chatroom {} - new message #{}: \'{}\' - {}'.format(room_id, message['ordinal'], message['message'], self.get_time()))
+    @staticmethod
+    def _same_message(a, b):
+        return a is not None and b is not None and \
+            (a['ordinal'], a['authorAlias'], a['message']) == (b['ordinal'], b['authorAlias'], b['message'])
 
-                                self.post_message(room_id=room_id, session_token=self.session_token, message="...".encode('utf-8'))
+    async def answer_room(self, room_id, queue):
+        '''
+        answers the messages of one room in order, cached answers right away,
+        the others on the scheduler (rooms are answered concurrently, their tagging is batched together)
+        '''
+        while True:
+            message = await queue.get()
+            response = self.cached_response(message['message'])
+            if response is not None:
+                self.post_in_order(room_id, response)
+                continue
+
+            deadline = self.chat_state[room_id].get('deadline')
+            try:
+                response = await asyncio.wrap_future(self.scheduler.submit(self.create_response, message['message'],
+                                                                           deadline))
+            except DeadlineExpired as e:
+                print('\t- Chatroom {} - dropped message #{}, the room ends ({}) - {}'.format(
+                    room_id, message['ordinal'], e, self.get_time()))
+                continue
+            except Exception as e:
+                print('\t\t Error: failed to answer message #{} in room {}: {}'.format(message['ordinal'], room_id, e))
+                continue
+
+            self.post_in_order(room_id, response)
+
+    def post_in_order(self, room_id, message):
+        '''
+        posts a message without waiting for it, the posts of a room keep their order
+        '''
+        previous = self.room_posts.get(room_id)
 
-                                response = self.create_response(message['message'])
+        async def post():
+            if previous is not None:
+                await asyncio.wait([previous])
+            try:
+                res = await self.client.async_post_message(room_id, self.session_token, message.encode('utf-8'))
+            except Exception as e:
+                res = {'description': str(e)}
+            if res.get('description') != 'Message received':
+                print('\t\t Error: failed to post message: {}'.format(message))
 
-                                self.post_message(room_id=room_id, session_token=self.session_token, message=response.encode('utf-8'))
-            time.sleep(listen_freq)
+        self.room_posts[room_id] = asyncio.ensure_future(post())
+        return self.room_posts[room_id]
 
     def login(self, username: str, password: str):
-        agent_details = requests.post(url=url + "/api/login", json={"username": username, "password": password}).json()
+        agent_details = self.client.login(username, password)
         print('- User {} successfully logged in with session \'{}\'!'.format(agent_details['userDetails']['username'], agent_details['sessionToken']))
         return agent_details
 
-    def check_rooms(self, session_token: str):
-        return requests.get(url=url + "/api/rooms", params={"session": session_token}).json()
-
-    def check_room_state(self, room_id: str, since: int, session_token: str):
-        return requests.get(url=url + "/api/room/{}/{}".format(room_id, since), params={"roomId": room_id, "since": since, "session": session_token}).json()
-
-    def post_message(self, room_id: str, session_token: str, message: str):
-        tmp_des = requests.post(url=url + "/api/room/{}".format(room_id),
-                                params={"roomId": room_id, "session": session_token}, data=message).json()
-        if tmp_des['description'] != 'Message received':
-            print('\t\t Error: failed to post message: {}'.format(message))
-
     def get_time(self):
         return time.strftime("%H:%M:%S, %d-%m-%Y", time.localtime())
 
     def logout(self):
-        if requests.get(url=url + "/api/logout", params={"session": self.session_token}).json()['description'] == 'Logged out':
+        if self.client.logout(self.session_token)['description'] == 'Logged out':
             print('- Session \'{}\' successfully logged out!'.format(self.session_token))
 
 
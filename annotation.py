@@ -0,0 +1,50 @@
+from flair.data import Sentence
+from text_utils import strip_end_punctuation
+
+
+class AnnotatedDocument:
+    '''
+    one message after tagging
+    entities: entity words from NER
+    Owords: the text around the entities
+    pos: (word, pos tag) pairs
+    '''
+
+    def __init__(self, message, text, sentence, entities, Owords, pos):
+        self.message = message
+        self.text = text
+        self.sentence = sentence
+        self.entities = entities
+        self.Owords = Owords
+        self.pos = pos
+
+    def __repr__(self):
+        return 'AnnotatedDocument({!r}, entities={}, Owords={})'.format(self.text, self.entities, self.Owords)
+
+
+class Annotator:
+    '''
+    tokenizes every message once and runs all taggers (NER models and POS)
+    over the same Sentence objects, each tagger writes under its own label name
+    '''
+
+    def __init__(self, ner_extractor, pos_extractor):
+        self.ner_extractor = ner_extractor
+        self.pos_extractor = pos_extractor
+
+    def annotate(self, message):
+        return self.annotate_batch([message])[0]
+
+    def annotate_batch(self, messages):
+        '''
+        returns an AnnotatedDocument per message
+        '''
+        texts = [strip_end_punctuation(message) for message in messages]
+        sentences = [Sentence(text) for text in texts]
+
+        ner_res = self.ner_extractor.tag_entities(texts, sentences)
+        pos_res = self.pos_extractor.tag_pos(sentences)
+
+        return [AnnotatedDocument(message, text, sentence, entities, Owords, pos)
+                for message, text, sentence, (entities, Owords), pos
+                in zip(messages, texts, sentences, ner_res, pos_res)]
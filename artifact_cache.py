@@ -0,0 +1,98 @@
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # no locking between processes (Windows), one process per artifact there
+    fcntl = None
+
+
+def source_stamp(paths):
+    '''
+    size and modification time of the source files an artifact was built from
+    '''
+    return [[p, os.path.getsize(p), os.path.getmtime(p)] for p in paths]
+
+
+@contextmanager
+def file_lock(lock_path):
+    '''
+    exclusive lock between processes on lock_path (created if missing)
+    '''
+    if fcntl is None:
+        yield
+        return
+    if os.path.dirname(lock_path):
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def atomic_write(path, write):
+    '''
+    write(f) into a temporary file next to path that is then renamed over path,
+    readers see the old or the new file, never a partly written one
+    '''
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+# _load_saved result of a missing, stale or unreadable artifact
+_STALE = object()
+
+
+def _load_saved(path, version, stamp):
+    if not os.path.exists(path):
+        return _STALE
+    try:
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+    except Exception as e:
+        print('\t\t Error: could not read {} ({}), rebuilding it'.format(path, e))
+        return _STALE
+    if not isinstance(saved, dict) or saved.get('version') != version or saved.get('sources') != stamp:
+        return _STALE
+    return saved['data']
+
+
+def load_or_build(path, sources, version, build, name='artifact'):
+    '''
+    loads a pickled artifact built from the given source files
+    (re)builds and saves it with build() if it is missing, unreadable, has another
+    version or the sources changed since it was built
+    processes starting together build it once: the build runs under a file lock
+    and the others load the result
+    '''
+
+    stamp = source_stamp(sources)
+    data = _load_saved(path, version, stamp)
+    if data is not _STALE:
+        return data
+
+    with file_lock(path + '.lock'):
+        # built by another process while this one waited for the lock
+        data = _load_saved(path, version, stamp)
+        if data is not _STALE:
+            return data
+
+        print('Compiling {}...'.format(name))
+        data = build()
+        atomic_write(path, lambda f: pickle.dump({'version': version, 'sources': stamp, 'data': data}, f,
+                                                 protocol=pickle.HIGHEST_PROTOCOL))
+
+    return data
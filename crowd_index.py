@@ -0,0 +1,73 @@
+import json
+import pandas as pd
+from artifact_cache import load_or_build
+
+
+# bump when the layout of the pickled index changes
+CROWD_INDEX_VERSION = 1
+
+
+def _aggregate(res, rates):
+    '''
+    majority vote, fix value and approval rate of the crowd rows of one (entity, relation)
+    returns (answer, approval rate, state)
+    '''
+
+    #aggregate answers from crowd
+    agg_dict = {}
+    for k,v in list(zip(res.Input3ID, res.AnswerLabel)):
+        if agg_dict.get(k):
+            agg_dict[k].append(v)
+        else:
+            agg_dict[k] = [v]
+
+    agg_res = {}
+    for k, v in agg_dict.items():
+        agg_res[k] = max(set(v), key=v.count)
+
+    hitid = list(set(res.HITId))[0]
+    rate_ans = rates.get(str(hitid))
+    ans =  str(list(agg_res.keys())[0]).strip('wd:')
+    state = list(agg_res.values())[0]
+
+    # filter nan types
+    filter_fix_val = set(filter(lambda x: isinstance(x, str), list(res.FixValue)))
+
+    if list(agg_res.values())[0] == 'INCORRECT' and filter_fix_val:
+        ans = str(list(filter_fix_val)[0]).strip('wd:')
+        state = 'CORRECT'
+
+    return ans, rate_ans, state
+
+
+def compile_crowd_index(clean_crowd_pd, rates):
+    '''
+    aggregates the crowd data once into {(entity id, relation id): (answer, approval rate, state)}
+    '''
+
+    index = {}
+    for (ent, rel), res in clean_crowd_pd.groupby(['Input1ID', 'Input2ID'], sort=False):
+        # only wd:entity / wdt:relation rows are ever searched
+        if not (isinstance(ent, str) and isinstance(rel, str) and ent.startswith('wd:') and rel.startswith('wdt:')):
+            continue
+        ans, rate_ans, state = _aggregate(res, rates)
+        if rate_ans is not None:
+            index[(ent[len('wd:'):], rel[len('wdt:'):])] = (ans, rate_ans, state)
+
+    return index
+
+
+def load_crowd_index(csv_path='Data/crowd_data/clean_crowd_data.csv',
+                     rates_path='Data/crowd_data/rates.json',
+                     index_path='Data/crowd_data/crowd_index.pkl'):
+    '''
+    loads the precompiled crowd index
+    (re)builds and saves it if it is missing or older than the crowd data
+    '''
+
+    def build():
+        with open(rates_path, 'r') as f:
+            rates = json.load(f)
+        return compile_crowd_index(pd.read_csv(csv_path), rates)
+
+    return load_or_build(index_path, [csv_path, rates_path], CROWD_INDEX_VERSION, build, 'crowd index')
@@ -0,0 +1,103 @@
+import os
+import numpy as np
+
+
+class EmbeddingStore:
+    '''
+    opens the embedding matrices memory mapped and read only
+    the OS page cache backs the arrays, so every bot process on the
+    same host shares the same physical pages instead of a private copy
+    '''
+
+    def __init__(self, mmap=True):
+        self.mmap = mmap
+        self.matrices = {}
+        self.paths = {}
+
+    def load(self, name, path):
+        '''
+        open a .npy matrix under a name and return it
+        loading the same name twice returns the already opened matrix
+        '''
+        if name in self.matrices:
+            return self.matrices[name]
+
+        if self.mmap:
+            matrix = np.load(path, mmap_mode='r')
+        else:
+            matrix = np.load(path)
+            matrix.setflags(write=False)
+
+        self.matrices[name] = matrix
+        self.paths[name] = os.path.realpath(path)
+        return matrix
+
+    def __getitem__(self, name):
+        return self.matrices[name]
+
+    def __contains__(self, name):
+        return name in self.matrices
+
+    def _smaps(self):
+        '''
+        sums Rss and shared bytes of the mappings of every file in /proc/self/smaps
+        returns None if smaps is not available (non Linux)
+        '''
+        try:
+            with open('/proc/self/smaps', 'r') as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+
+        res = {}
+        current = None
+        for line in lines:
+            fields = line.split()
+            # mapping header: address perms offset dev inode [path]
+            if '-' in fields[0] and len(fields) >= 5 and not fields[0].endswith(':'):
+                current = ' '.join(fields[5:]) if len(fields) > 5 else None
+                if current is not None:
+                    res.setdefault(current, {'rss': 0, 'shared': 0})
+            elif current is not None and fields[0] in ('Rss:', 'Shared_Clean:', 'Shared_Dirty:'):
+                kb = int(fields[1]) * 1024
+                if fields[0] == 'Rss:':
+                    res[current]['rss'] += kb
+                else:
+                    res[current]['shared'] += kb
+        return res
+
+    def memory_report(self):
+        '''
+        per matrix: mapped bytes (size of the array) and resident bytes
+        (pages of it currently in this process' RSS, of which shared
+        are also mapped by other processes)
+        resident is None when it cannot be measured
+        '''
+        smaps = self._smaps() if self.mmap else None
+
+        report = {}
+        for name, matrix in self.matrices.items():
+            entry = {'path': self.paths[name],
+                     'shape': list(matrix.shape),
+                     'dtype': str(matrix.dtype),
+                     'mapped_bytes': int(matrix.nbytes),
+                     'resident_bytes': None,
+                     'shared_bytes': None}
+            if not self.mmap:
+                # a private copy is fully resident
+                entry['resident_bytes'] = int(matrix.nbytes)
+                entry['shared_bytes'] = 0
+            elif smaps is not None:
+                usage = smaps.get(self.paths[name], {'rss': 0, 'shared': 0})
+                entry['resident_bytes'] = usage['rss']
+                entry['shared_bytes'] = usage['shared']
+            report[name] = entry
+
+        return report
+
+    def print_memory_report(self):
+        for name, entry in self.memory_report().items():
+            resident = entry['resident_bytes']
+            resident = '?' if resident is None else '{:.1f} MB'.format(resident / 2**20)
+            print('\t- {} {} {}: mapped {:.1f} MB, resident {}'.format(
+                name, tuple(entry['shape']), entry['dtype'], entry['mapped_bytes'] / 2**20, resident))
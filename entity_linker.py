@@ -0,0 +1,136 @@
+import re
+import numpy as np
+from vector_search import load_vector_index
+
+
+def normalize_name(name):
+    '''
+    normalized form of an entity name used for the fast path
+    case, dash variants, quotes and extra whitespace are ignored
+    '''
+    name = name.casefold()
+    name = re.sub('[\u2010-\u2015\u2212]', '-', name)
+    name = re.sub('[\u2018\u2019\u201c\u201d"`]', "'", name)
+    return ' '.join(name.split())
+
+
+class EntityLinker:
+    '''
+    links entity mentions to entity names from the graph
+    1) exact name lookup in name2ent
+    2) normalized name lookup
+    3) mention cache of earlier transformer results (if given)
+    4) sentence transformer embedding + nearest title in the title index
+    only mentions never seen before run through the transformer
+    '''
+
+    PATHS = ('exact', 'normalized', 'cached', 'fuzzy')
+
+    def __init__(self, encoder, ent_codes, title_embeddings, ent2name, name2ent, index_path=None,
+                 mention_cache=None):
+        self.encoder = encoder
+        self.mention_cache = mention_cache
+        self.ent_codes = ent_codes
+        self.ent2name = ent2name
+        self.name2ent = name2ent
+
+        # first name wins for names that normalize to the same string
+        self.norm2name = {}
+        for name in name2ent:
+            self.norm2name.setdefault(normalize_name(name), name)
+
+        self.title_index = load_vector_index(title_embeddings, index_path)
+
+        self.counts = dict.fromkeys(self.PATHS, 0)
+
+    def _lookup(self, mention):
+        '''
+        fast path, returns (name, path) or (None, None)
+        '''
+        if mention in self.name2ent:
+            return mention, 'exact'
+        name = self.norm2name.get(normalize_name(mention))
+        if name is not None:
+            return name, 'normalized'
+        return None, None
+
+    def fast_lookup(self, mention):
+        '''
+        entity name of a mention from the exact / normalized lookup only, None on a miss
+        '''
+        return self._lookup(mention)[0]
+
+    def link(self, mention):
+        '''
+        returns the entity name that best matches the mention
+        '''
+        return self.link_batch([mention])[0]
+
+    def link_batch(self, mentions):
+        '''
+        links several mentions at once
+        the mentions that need the transformer are encoded in one call
+        '''
+        res = [None] * len(mentions)
+        fuzzy = []
+        for i, mention in enumerate(mentions):
+            name, path = self._lookup(mention)
+            if name is None:
+                fuzzy.append(i)
+            else:
+                res[i] = name
+                self.counts[path] += 1
+
+        if fuzzy and self.mention_cache is not None:
+            missed = []
+            for i in fuzzy:
+                entry = self.mention_cache.get(mentions[i])
+                if entry is None:
+                    missed.append(i)
+                else:
+                    res[i] = self.ent2name[entry[1]]
+                    self.counts['cached'] += 1
+            fuzzy = missed
+
+        if fuzzy:
+            ents = self._encode_and_resolve([mentions[i] for i in fuzzy])
+            for i, ent in zip(fuzzy, ents):
+                res[i] = self.ent2name[ent]
+                self.counts['fuzzy'] += 1
+
+        return res
+
+    def _encode_and_resolve(self, mentions):
+        '''
+        transformer embedding of the mentions and the entity code of their nearest title
+        the results are added to the mention cache
+        '''
+        embs = np.asarray(self.encoder.encode(mentions)).reshape(len(mentions), -1)
+        ents = []
+        for emb in embs:
+            most_likely, _ = self.title_index.search(emb, 1)
+            ents.append(self.ent_codes[most_likely[0]])
+
+        if self.mention_cache is not None:
+            self.mention_cache.put_batch(mentions, embs, ents)
+        return ents
+
+    def warm(self, mentions, batch_size=256):
+        '''
+        fills the mention cache with the mentions that are not linked by name
+        and not cached yet, returns how many were encoded
+        '''
+        if self.mention_cache is None:
+            return 0
+        todo = [m for m in dict.fromkeys(mentions)
+                if self._lookup(m)[0] is None and m not in self.mention_cache]
+        for start in range(0, len(todo), batch_size):
+            self._encode_and_resolve(todo[start:start + batch_size])
+        return len(todo)
+
+    def hit_rates(self):
+        '''
+        share of linked mentions served by each path
+        '''
+        total = sum(self.counts.values())
+        return {path: (n / total if total else 0.0) for path, n in self.counts.items()}
@@ -0,0 +1,51 @@
+import json
+from artifact_cache import load_or_build
+
+
+# bump when the layout of the pickled index changes
+IMAGE_INDEX_VERSION = 1
+
+
+def build_image_index(images):
+    '''
+    groups the image records by (IMDb ID, role)
+    roles: 'poster' and 'still' for images of a single movie, 'cast' for non poster images of a single person
+    candidates keep the order of images.json, the first one is the best match
+    '''
+    index = {}
+    for image in images:
+        im_id = 'image:' + image['img'].strip('.jpg')
+        if len(image['movie']) == 1:
+            role = 'poster' if image['type'] == 'poster' else 'still'
+            index.setdefault((image['movie'][0], role), []).append(im_id)
+        if len(image['cast']) == 1 and image['type'] != 'poster':
+            index.setdefault((image['cast'][0], 'cast'), []).append(im_id)
+    return index
+
+
+class ImageIndex:
+    '''
+    poster / still / cast image lookup by IMDb ID
+    built once from images.json and cached as a pickle next to it
+    '''
+
+    def __init__(self, json_path='Data/images.json', index_path='Data/images_index.pkl'):
+
+        def build():
+            with open(json_path, 'r') as f:
+                return build_image_index(json.load(f))
+
+        self.index = load_or_build(index_path, [json_path], IMAGE_INDEX_VERSION, build, 'image index')
+
+    def candidates(self, imdb_id, role):
+        '''
+        ranked image ids for an IMDb ID and a role ('poster', 'still', 'cast')
+        '''
+        return self.index.get((imdb_id, role), [])
+
+    def lookup(self, imdb_id, role):
+        '''
+        best image id for an IMDb ID and a role, '' if there is none
+        '''
+        candidates = self.candidates(imdb_id, role)
+        return candidates[0] if candidates else ''
@@ -1,22 +1,36 @@
-import pandas as pd
 import numpy as np
-from sklearn.metrics import pairwise_distances
 import inflect
 import re
-import json
+import rdflib
 
+WD = rdflib.Namespace('http://www.wikidata.org/entity/')
+WDT = rdflib.Namespace('http://www.wikidata.org/prop/direct/')
+RDFS = rdflib.namespace.RDFS
 
 class IntentionDecider():
 
-    def __init__(self):
+    def __init__(self, crowd_index, entity_index, label_service, movie_metadata, recommendation_index,
+                 intent_matcher):
 
         self.inflect_engine = inflect.engine()
 
-        print('Loading Clean crowd data and rates...')
-        self.clean_crowd_pd = pd.read_csv('Data/crowd_data/clean_crowd_data.csv')
+        # crowd answers aggregated per (entity, relation)
+        self.crowd_index = crowd_index
 
-        with open("Data/crowd_data/rates.json", "r") as f:
-            self.rates = json.load(f)
+        # nearest neighbour search over the entity embeddings (approximate index or exact search)
+        self.entity_index = entity_index
+
+        # english label table
+        self.label_service = label_service
+
+        # release years
+        self.movie_metadata = movie_metadata
+
+        # genre / cast member posting lists
+        self.recommendation_index = recommendation_index
+
+        # single pass phrase matcher for the genres
+        self.intent_matcher = intent_matcher
 
 
     def crowdsource_search(self, ent, rel):
@@ -27,38 +41,7 @@ class IntentionDecider():
         if no answer return None
         '''
 
-        res = self.clean_crowd_pd[(self.clean_crowd_pd['Input1ID'] == f"wd:{ent}") & (self.clean_crowd_pd['Input2ID'] == f"wdt:{rel}")]
-
-        # if there exists an answer
-        if bool(list(res.HITId)):
-
-            #aggregate answers from crowd
-            agg_dict = {}
-            for k,v in list(zip(res.Input3ID, res.AnswerLabel)):
-                if agg_dict.get(k):
-                    agg_dict[k].append(v)
-                else:
-                    agg_dict[k] = [v]
-
-            agg_res = {}
-            for k, v in agg_dict.items():
-                agg_res[k] = max(set(v), key=v.count)
-
-            hitid = list(set(res.HITId))[0]
-            rate_ans = self.rates[str(hitid)]
-            ans =  str(list(agg_res.keys())[0]).strip('wd:')
-            state = list(agg_res.values())[0]
-
-            # filter nan types
-            filter_fix_val = set(filter(lambda x: isinstance(x, str), list(res.FixValue)))
-
-            if list(agg_res.values())[0] == 'INCORRECT' and filter_fix_val:
-                ans = str(list(filter_fix_val)[0]).strip('wd:')
-                state = 'CORRECT'
-
-            return ans, rate_ans, state
-        else:
-            return None, None, None
+        return self.crowd_index.get((ent, rel), (None, None, None))
 
 
     def embeddings(self, WD, WDT, entity_emb, ent2id, ent2lbl, id2ent, relation_emb, rel2id, ent, rel, num_ret):
@@ -75,13 +58,11 @@ class IntentionDecider():
             pred = relation_emb[rel2id[WDT[rel]]]
             # add vectors according to TransE scoring function.
             lhs = head + pred
-            # compute distance to *any* entity
-            dist = pairwise_distances(lhs.reshape(1, -1), entity_emb).reshape(-1)
-            # find most plausible entities
-            most_likely = dist.argsort()
+            # find the most plausible entities
+            most_likely, dist = self.entity_index.search(lhs, num_ret)
 
 
-            return [{'label':ent2lbl[id2ent[idx]], 'Score': dist[idx]} for idx in most_likely[:num_ret]]
+            return [{'label':ent2lbl[id2ent[idx]], 'Score': d} for idx, d in zip(most_likely, dist)]
         except:
             return []
 
@@ -97,12 +78,11 @@ class IntentionDecider():
         # averaging input movies embeddings
         mean_emb = np.mean([entity_emb[ent2id[WD[idd]]] for idd in m_ids], 0)
 
-        dist = pairwise_distances(mean_emb.reshape(1, -1), entity_emb).reshape(-1)
         # find most plausible entities to the average of the input movies embeddings
-        most_likely = dist.argsort()
+        most_likely, dist = self.entity_index.search(mean_emb, 15+len(m_ids))
 
         res = []
-        for idx in most_likely[:15+len(m_ids)]:
+        for idx, d in zip(most_likely, dist):
             #check if the recommendation is a movie
             # avoid return other types of entities besides movies
             g = list(filter(lambda x: str(x).split('/')[-1] in cat2id['MISC']['ids'],
@@ -111,33 +91,26 @@ class IntentionDecider():
             if g and id2ent[idx][len(WD):] not in m_ids and ent2lbl.get(id2ent[idx]):
                 res.append({'ent':id2ent[idx][len(WD):],
                             'label':ent2lbl[id2ent[idx]],
-                            'Score': dist[idx]})
+                            'Score': d})
 
         return res[:3]
 
-    def movie_recom_genre(self, graph, genre):
+    def _labelled_movie(self, graph, movie):
         '''
-        recommend a random movie based on genre
+        adds the label to a recommended movie ID
         '''
 
-        query = f'''
-        prefix wdt: <http://www.wikidata.org/prop/direct/>
-        prefix wd: <http://www.wikidata.org/entity/>
+        if movie is None:
+            return None
 
-        SELECT ?obj ?lbl
-        WHERE {{
-          ?obj wdt:P136 wd:{genre} .
-          ?obj rdfs:label ?lbl .
-          FILTER(LANG(?lbl) = "en").
-          }}
-        ORDER BY RAND() LIMIT 1
+        return {'ent': movie, 'label': self.label_service.label(WD[movie])}
 
+    def movie_recom_genre(self, graph, genre):
+        '''
+        recommend a random movie based on genre
         '''
-        qres = list(graph.query(query))[0]
-
-        res = {'ent':str(qres[0]).split('/')[-1], 'label': str(qres[1])}
 
-        return res if res else None
+        return self._labelled_movie(graph, self.recommendation_index.sample_genre(genre))
 
 
     def movie_recom_actor_genre(self, graph, actor, genre):
@@ -145,67 +118,28 @@ class IntentionDecider():
         recommend a randoom movie based on an actor input and a genre
         '''
 
-        query = f'''
-        prefix wdt: <http://www.wikidata.org/prop/direct/>
-        prefix wd: <http://www.wikidata.org/entity/>
-
-        SELECT ?obj ?lbl
-        WHERE {{
-          ?obj wdt:P136 wd:{genre} .
-          ?obj rdfs:label ?lbl .
-          FILTER(LANG(?lbl) = "en").
-          }}
-        ORDER BY RAND() LIMIT 1
-
-        '''
-        qres = list(graph.query(query))[0]
-
-        res = {'ent':str(qres[0]).split('/')[-1], 'label': str(qres[1])}
-
-        return res if res else None
+        return self._labelled_movie(graph, self.recommendation_index.sample_actor_genre(actor, genre))
 
     def movie_recom_actor(self, graph, actor):
         '''
         reccommend a random movie based on an input actor
         '''
 
-        query = f'''
-        prefix wdt: <http://www.wikidata.org/prop/direct/>
-        prefix wd: <http://www.wikidata.org/entity/>
-
-        SELECT ?obj ?lbl
-        WHERE {{
-          ?obj wdt:P161 wd:{actor} .
-          ?obj rdfs:label ?lbl .
-          FILTER(LANG(?lbl) = "en").
-        }}
-        ORDER BY RAND() LIMIT 1
-
-        '''
-        qres = list(graph.query(query))[0]
-
-        res = {'ent':str(qres[0]).split('/')[-1], 'label': str(qres[1])}
-
-        return res if res else None
+        return self._labelled_movie(graph, self.recommendation_index.sample_actor(actor))
 
     def get_movie_year(self, graph, ent):
         '''
         return the year of release of a movie
         '''
 
-        query = f'''
-            prefix wdt: <http://www.wikidata.org/prop/direct/>
-            prefix wd: <http://www.wikidata.org/entity/>
-
-            SELECT ?obj
-            WHERE {{
-              wd:{ent} wdt:P577  ?obj.
-            }} ORDER BY ASC(?obj)
-             LIMIT 1
+        return self.movie_metadata.year_suffixes([ent])[0]
 
+    def get_movie_years(self, graph, ents):
+        '''
+        return the year of release of a list of movies in one call
         '''
-        res = list(graph.query(query))
-        return f" ({str(max([int(i) for i in res[0][0].split('-')]))})" if res else ''
+
+        return self.movie_metadata.year_suffixes(ents)
 
     def _EntityURI_to_ID(self, URI_LIST, WD='http://www.wikidata.org/entity/'):
         '''
@@ -246,21 +180,7 @@ class IntentionDecider():
         '''
         method that recieves a URI list and returns the name list of the uris
         '''
-        res = []
-        for r in URI_LIST:
-
-            query = f'''
-                    prefix wdt: <http://www.wikidata.org/prop/direct/>
-                    prefix wd: <http://www.wikidata.org/entity/>
-
-                    SELECT ?res
-                    WHERE
-                    {{
-                    wd:{r} rdfs:label ?res .
-                    FILTER(LANG(?res) = "en").
-                    }}'''
-            res.extend([str(i[0]) for i in set(graph.query(query))])
-        return res
+        return self.label_service.labels_of_ids(URI_LIST)
 
     def knowledge_graph_search(self, graph, g, ent, rel, rid):
         '''
@@ -349,7 +269,7 @@ class IntentionDecider():
             return ''
 
 
-    def decider(self, graph, WD, WDT, ent, rel, Owords, entity_emb, ent2id, ent2lbl, id2ent, relation_emb, rel2id, images, genre_dict, cat2id):
+    def decider(self, graph, WD, WDT, ent, rel, Owords, entity_emb, ent2id, ent2lbl, id2ent, relation_emb, rel2id, images, genre_dict, cat2id, fast=False):
         '''
         main Method for this Class
         given all information trackeed form previous classes it decides the final answer
@@ -362,6 +282,8 @@ class IntentionDecider():
         Else, it uses all other relations (intents) and retrieves the answers
         and returns final answer
 
+        fast skips the embedding search after the knowledge graph search (answers short on time)
+
         '''
 
 
@@ -372,25 +294,13 @@ class IntentionDecider():
             # based on movies
             if ent.get('MISC'):
                 res = self.movie_recom_movie(graph, ent, WD, WDT, entity_emb, ent2id, ent2lbl, id2ent, relation_emb, rel2id, cat2id)
-                ent_print_list = []
-                for r in res:
-                    ent_print_list.append(f"{r['label']}{self.get_movie_year(graph, r['ent'])}")
+                years = self.get_movie_years(graph, [r['ent'] for r in res])
+                ent_print_list = [f"{r['label']}{y}" for r, y in zip(res, years)]
                 final_ans += f" Hmm... I could recommend you {', '.join(ent_print_list)}."
             else:
 
                 #pattern match for genres
-                Osent = ' '.join(Owords)
-                genre = ''
-                for v in genre_dict.values():
-                    words = v['words']
-                    found = False
-                    for w in words:
-                        if re.search(w, Osent.lower()):
-                            genre = v['id']
-                            found = True
-                            break
-                    if found:
-                        break
+                genre = self.intent_matcher.genre(' '.join(Owords))
 
                 #if PERson entity  and genre exist
                 if ent.get('PER') and genre:
@@ -437,20 +347,8 @@ class IntentionDecider():
                                 imbds.append(str(i))
                             imdb_id = imbds[0]
 
-                            im_id = ''
-                            for image in images:
-
-                                if k == 'MISC':
-                                    if image['movie'] == [imdb_id] and image['type'] == 'poster':
-                                        im_id = image['img']
-                                        im_id = 'image:'+im_id.strip('.jpg')
-                                        break
-                                else:
-                                    if image['cast'] == [imdb_id] and image['type'] != 'poster':
-                                        im_id = image['img']
-                                        im_id = 'image:'+im_id.strip('.jpg')
-                                        break
-
+                            # movies get their poster, persons a non poster picture of them
+                            im_id = images.lookup(imdb_id, 'poster' if k == 'MISC' else 'cast')
 
                             if im_id:
                                 final_ans += f" There you go... {im_id}"
@@ -468,6 +366,8 @@ class IntentionDecider():
                             final_ans += kg_res[0]
 
                             #embedding search
+                            if fast:
+                                continue
                             n_to_retr = kg_res[1]
 
                             final_ans += self.embeddings_search(graph, WD, WDT, entity_emb, ent2id, ent2lbl, id2ent, relation_emb,
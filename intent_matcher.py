@@ -0,0 +1,269 @@
+import re
+import timeit
+from functools import lru_cache
+from collections import namedtuple
+
+
+# rewrites of relations that consist of the same words as other relations
+# applied to the message before NER
+REWRITES = [
+    ('executive producer', 'showrunner'),
+    ('production designer', 'designer'),
+    ('costume designer', 'costume'),
+    ('box office', 'box'),
+    ('narrative location', 'nlocation'),
+    ('filming location', 'flocation'),
+    ('production company', 'company'),
+]
+
+# intents detected by phrases in the Other words
+# an intent fires if all phrases of any of its rules occur in the lower cased text
+# (in the text itself for case_sensitive intents)
+INTENT_RULES = [
+    {'relation': 'filming location', 'ids': ['P915'],
+     'any_of': [('where', 'film'), ('location', 'film'), ('place', 'film'),
+                ('shooting', 'location'), ('shot in',), ('filmed in',)]},
+    {'relation': 'narrative location', 'ids': ['P840'],
+     'any_of': [('where', 'narrat'), ('where', 'set'), ('where', 'takes place'), ('place', 'set'),
+                ('location', 'set'), ('location', 'narrat'), ('set', 'work')]},
+    {'relation': 'MPAA rating', 'ids': ['P1657'], 'case_sensitive': True,
+     'any_of': [('MPA',)]},
+    {'relation': 'IMDb ID', 'ids': ['P345'],
+     'any_of': [('look like',), ('looks like',), ('picture',), ('poster',)]},
+    {'relation': 'recommendation', 'ids': [],
+     'any_of': [('recommend',), ('recommendation',), ('suggest',), ('suggestion',)]},
+]
+
+
+# genres and their synonyms that will be used for matching
+GENRE_DICT = {
+    'drama film': {'words': ['drama'], 'id': 'Q130232'},
+    'documentary film': {'words': ['documentary', 'factual'], 'id': 'Q93204'},
+    'comedy film': {'words': ['funny', 'comedy', 'comedic'], 'id': 'Q157443'},
+    'crime film': {'words': ['crime'], 'id': 'Q959790'},
+    'action film': {'words': ['action'], 'id': 'Q188473'},
+    'romance film': {'words': ['romantic', 'romance'], 'id': 'Q1054574'},
+    'horror film': {'words': ['horror', 'scary'], 'id': 'Q200092'},
+    'adventure film': {'words': ['adventure'], 'id': 'Q319221'},
+    'neo-noir': {'words': ['neo-noir', 'new-black', 'neo noir', 'new black'], 'id': 'Q2421031'},
+    'science fiction': {'words': ['science fiction', 'SF', 'scifi', 'sci Fi', 'fantasy'
+                                  'sci-Fi', 'science-fiction', 'sci fi', 'sciencefiction'], 'id': 'Q24925'},
+    'thriller film': {'words': ['thriller', 'suspense'], 'id': 'Q2484376'},
+    'animated film': {'words': ['animated', 'animation', 'cartoon'], 'id': 'Q202866'},
+}
+
+
+MatchResult = namedtuple('MatchResult', ['relations', 'genre', 'phrases'])
+
+
+def _trie_pattern(phrases):
+    '''
+    regex of a set of phrases factored by common prefix,
+    the greedy optional branches match the longest phrase first
+    '''
+    trie = {}
+    for p in phrases:
+        node = trie
+        for c in p:
+            node = node.setdefault(c, {})
+        node[''] = {}
+
+    def pattern(node):
+        terminal = '' in node
+        branches = [re.escape(c) + pattern(child) for c, child in sorted(node.items()) if c]
+        if not branches:
+            return ''
+        alt = branches[0] if len(branches) == 1 else '(?:{})'.format('|'.join(branches))
+        if terminal:
+            return '(?:{})?'.format(alt)
+        return alt
+
+    return pattern(trie)
+
+
+def _phrase_regex(phrases):
+    '''
+    one regex finding every phrase occurrence in one scan
+    the lookahead reports the longest phrase starting at each position,
+    the phrases contained in it are added through the containment closure
+    '''
+    phrases = set(phrases)
+    if not phrases:
+        return None, {}
+    regex = re.compile('(?=({}))'.format(_trie_pattern(phrases)))
+    contained = {p: frozenset(q for q in phrases if q in p) for p in phrases}
+    return regex, contained
+
+
+class IntentMatcher:
+    '''
+    declarative phrase rules compiled into a few combined regexes
+    rewrite() does all the message rewrites in one substitution,
+    scan() finds the intents and the genre of a text in one pass
+    '''
+
+    def __init__(self, genre_dict=None, rewrites=REWRITES, intent_rules=INTENT_RULES):
+        self.rewrites = dict(rewrites)
+        self.rewrite_regex = re.compile('|'.join(re.escape(k) for k, _ in sorted(rewrites, key=lambda r: -len(r[0]))))
+
+        # every rule of an intent as the set of phrases that all have to be found
+        self.intent_rules = [(r['relation'], tuple(r['ids']), bool(r.get('case_sensitive')),
+                              [frozenset(rule) for rule in r['any_of']])
+                             for r in intent_rules]
+        # genres keep the order of genre_dict, the first genre with a matching word wins
+        self.genres = [(v['id'], frozenset(v['words'])) for v in (genre_dict or {}).values()]
+
+        lower = [p for _, _, cs, rules in self.intent_rules if not cs for rule in rules for p in rule]
+        lower += [w for _, words in self.genres for w in words]
+        cased = [p for _, _, cs, rules in self.intent_rules if cs for rule in rules for p in rule]
+        self.lower_regex, self.lower_contained = _phrase_regex(lower)
+        self.cased_regex, self.cased_contained = _phrase_regex(cased)
+
+        self.scan = lru_cache(maxsize=1024)(self._scan)
+
+    def rewrite(self, message):
+        '''
+        applies all rewrites in a single pass over the message
+        '''
+        return self.rewrite_regex.sub(lambda m: self.rewrites[m.group(0)], message)
+
+    def _find(self, regex, contained, text):
+        found = set()
+        if regex is not None:
+            for p in regex.findall(text):
+                if p:
+                    found.update(contained[p])
+        return found
+
+    def _scan(self, text):
+        '''
+        returns the detected relations (in rule order), the genre id ('' if none)
+        and the phrases found
+        '''
+        lower = self._find(self.lower_regex, self.lower_contained, text.lower())
+        cased = self._find(self.cased_regex, self.cased_contained, text)
+
+        relations = []
+        for relation, ids, case_sensitive, rules in self.intent_rules:
+            found = cased if case_sensitive else lower
+            for rule in rules:
+                if rule <= found:
+                    relations.append((relation, ids))
+                    break
+
+        genre = ''
+        for genre_id, words in self.genres:
+            if not words.isdisjoint(lower):
+                genre = genre_id
+                break
+
+        return MatchResult(tuple(relations), genre, frozenset(lower | cased))
+
+    def relations(self, text):
+        '''
+        relations of the phrase intents in text, as get_relations returns them
+        '''
+        return [{'relation': relation, 'ids': list(ids)} for relation, ids in self.scan(text).relations]
+
+    def genre(self, text):
+        '''
+        id of the first genre (in genre_dict order) with a word in text, '' if none
+        '''
+        return self.scan(text).genre
+
+
+def _legacy_match(message, Osent, genre_dict):
+    '''
+    the sequential re.sub / re.search matching the matcher replaces, kept for the benchmark
+    '''
+    for k, v in REWRITES:
+        message = re.sub(k, v, message)
+
+    res = []
+    fil = [
+        re.search('where', Osent.lower()) and re.search('film', Osent.lower()),
+        re.search('location', Osent.lower()) and re.search('film', Osent.lower()),
+        re.search('place', Osent.lower()) and  re.search('film', Osent.lower()),
+        re.search('shooting', Osent.lower()) and re.search('location', Osent.lower()),
+        re.search('shot in', Osent.lower()),
+        re.search('filmed in', Osent.lower())
+    ]
+    if any(fil):
+        res.append({'relation':'filming location', 'ids': ['P915']})
+    narr = [
+        re.search('where', Osent.lower()) and re.search('narrat', Osent.lower()),
+        re.search('where', Osent.lower()) and re.search('set', Osent.lower()),
+        re.search('where', Osent.lower()) and re.search('takes place', Osent.lower()),
+        re.search('place', Osent.lower()) and re.search('set', Osent.lower()),
+        re.search('location', Osent.lower()) and re.search('set', Osent.lower()),
+        re.search('location', Osent.lower()) and re.search('narrat', Osent.lower()),
+        re.search('set', Osent.lower()) and re.search('work', Osent.lower()),
+    ]
+    if any(narr):
+        res.append({'relation':'narrative location', 'ids': ['P840']})
+    if re.search('MPA', Osent):
+        res.append({'relation':'MPAA rating', 'ids': ['P1657']})
+    picture = [re.search('look like', Osent.lower()),
+               re.search('looks like', Osent.lower()),
+               re.search('picture', Osent.lower()),
+               re.search('poster', Osent.lower())]
+    if any(picture):
+        res.append({'relation': 'IMDb ID', 'ids': ['P345']})
+    recom = [re.search('recommend', Osent.lower()),
+             re.search('recommendation', Osent.lower()),
+             re.search('suggest', Osent.lower()),
+             re.search('suggestion', Osent.lower())]
+    if any(recom):
+        res.append({'relation': 'recommendation', 'ids': []})
+
+    genre = ''
+    for v in genre_dict.values():
+        found = False
+        for w in v['words']:
+            if re.search(w, Osent.lower()):
+                genre = v['id']
+                found = True
+                break
+        if found:
+            break
+
+    return message, res, genre
+
+
+def benchmark(messages, genre_dict, number=2000):
+    '''
+    per message matching cost of the legacy regexes and of the matcher (cache off)
+    also checks that both give the same result
+    '''
+    matcher = IntentMatcher(genre_dict)
+
+    for m in messages:
+        matched = (matcher.rewrite(m), matcher.relations(m), matcher.genre(m))
+        assert _legacy_match(m, m, genre_dict) == matched, m
+
+    legacy = timeit.timeit(lambda: [_legacy_match(m, m, genre_dict) for m in messages], number=number)
+    compiled = timeit.timeit(lambda: [(matcher.rewrite(m), matcher._scan(m)) for m in messages], number=number)
+
+    n = number * len(messages)
+    return {'legacy_us': 1e6 * legacy / n, 'matcher_us': 1e6 * compiled / n}
+
+
+if __name__ == '__main__':
+    # python intent_matcher.py
+    questions = [
+        'Who is the director of Good Will Hunting?',
+        'Who directed The Bridge on the River Kwai?',
+        'Where was The Godfather filmed?',
+        'What is the filming location of Heat?',
+        'Where is Inception set?',
+        'What is the MPAA rating of Shrek?',
+        'What does Julia Roberts look like?',
+        'Let me know what Sandra Bullock looks like.',
+        'Recommend movies similar to Hamlet and Othello.',
+        'Can you suggest a scary movie with Tom Hanks?',
+        'I would like a funny romantic movie recommendation',
+        'Who is the executive producer of Game of Thrones?',
+        'What is the box office of The Princess and the Frog?',
+        'When was The Godfather released?',
+    ]
+    print(benchmark(questions, GENRE_DICT))
@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import bisect
+from functools import lru_cache
+import numpy as np
+import rdflib
+
+
+# version of the on disk layout, bump when the files below change
+SNAPSHOT_VERSION = 1
+
+# kind prefixes used in the term keys
+_URI, _BNODE, _LITERAL = 'U', 'B', 'L'
+
+
+def _term_key(term):
+    '''
+    encodes an rdflib term to the key stored in the term dictionary
+    the key is unique per term and decodes back to the same term
+    '''
+    if isinstance(term, rdflib.term.Literal):
+        if term.language:
+            suffix = '@' + term.language
+        elif term.datatype:
+            suffix = '^^' + str(term.datatype)
+        else:
+            suffix = ''
+        return _LITERAL + str(term) + '\x00' + suffix
+    elif isinstance(term, rdflib.term.BNode):
+        return _BNODE + str(term)
+    return _URI + str(term)
+
+
+def _key_term(key):
+    '''
+    decodes a term key back to an rdflib term
+    '''
+    kind, body = key[0], key[1:]
+    if kind == _URI:
+        return rdflib.term.URIRef(body)
+    elif kind == _BNODE:
+        return rdflib.term.BNode(body)
+
+    lex, _, suffix = body.rpartition('\x00')
+    if suffix.startswith('@'):
+        return rdflib.term.Literal(lex, lang=suffix[1:])
+    elif suffix.startswith('^^'):
+        return rdflib.term.Literal(lex, datatype=rdflib.term.URIRef(suffix[2:]))
+    return rdflib.term.Literal(lex)
+
+
+class _TermKeys:
+    '''
+    sequence view over the sorted term keys in the memory mapped blob
+    used with bisect to find the id of a term without a python dict
+    '''
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        return self.blob[self.offsets[idx]:self.offsets[idx + 1]].tobytes()
+
+
+def compile_snapshot(nt_path='Data/14_graph.nt', out_dir='Data/kg_snapshot'):
+    '''
+    one time compile step
+    parses the N-Triples graph and writes an integer encoded triple store:
+    a sorted term dictionary and the SPO / POS index arrays
+    '''
+
+    print('Parsing graph {}...'.format(nt_path))
+    graph = rdflib.Graph().parse(nt_path, format='turtle')
+
+    print('Building term dictionary...')
+    keys = set()
+    for s, p, o in graph:
+        keys.add(_term_key(s).encode('utf-8'))
+        keys.add(_term_key(p).encode('utf-8'))
+        keys.add(_term_key(o).encode('utf-8'))
+
+    # term ids follow the byte order of the keys so lookups can bisect
+    keys = sorted(keys)
+    key2id = {k: i for i, k in enumerate(keys)}
+
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(k) for k in keys], out=offsets[1:])
+
+    print('Encoding {} triples...'.format(len(graph)))
+    triples = np.empty((len(graph), 3), dtype=np.int32)
+    for i, (s, p, o) in enumerate(graph):
+        triples[i] = (key2id[_term_key(s).encode('utf-8')],
+                      key2id[_term_key(p).encode('utf-8')],
+                      key2id[_term_key(o).encode('utf-8')])
+    del graph, key2id
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, 'terms.bin'), 'wb') as f:
+        for k in keys:
+            f.write(k)
+    np.save(os.path.join(out_dir, 'term_offsets.npy'), offsets)
+
+    # lexsort sorts by the last key first
+    spo = np.lexsort((triples[:, 2], triples[:, 1], triples[:, 0]))
+    pos = np.lexsort((triples[:, 0], triples[:, 2], triples[:, 1]))
+    for name, col in [('s', 0), ('p', 1), ('o', 2)]:
+        np.save(os.path.join(out_dir, 'spo_{}.npy'.format(name)), triples[spo, col])
+        np.save(os.path.join(out_dir, 'pos_{}.npy'.format(name)), triples[pos, col])
+
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({'version': SNAPSHOT_VERSION, 'source': nt_path,
+                   'terms': len(keys), 'triples': len(triples)}, f)
+
+    print('Snapshot written to {}'.format(out_dir))
+
+
+class KGSnapshot:
+    '''
+    read only graph accessor over a compiled snapshot
+    arrays are memory mapped, so opening takes no time and
+    several processes share the same pages
+    supports the rdflib.Graph lookups used by the bot
+    '''
+
+    def __init__(self, path='Data/kg_snapshot'):
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != SNAPSHOT_VERSION:
+            raise ValueError('KG snapshot in {} has version {}, expected {}. Recompile it with kg_snapshot.py'
+                             .format(path, self.meta['version'], SNAPSHOT_VERSION))
+
+        self.path = path
+        blob = np.memmap(os.path.join(path, 'terms.bin'), dtype=np.uint8, mode='r')
+        offsets = np.load(os.path.join(path, 'term_offsets.npy'), mmap_mode='r')
+        self._keys = _TermKeys(blob, offsets)
+
+        self.spo_s = np.load(os.path.join(path, 'spo_s.npy'), mmap_mode='r')
+        self.spo_p = np.load(os.path.join(path, 'spo_p.npy'), mmap_mode='r')
+        self.spo_o = np.load(os.path.join(path, 'spo_o.npy'), mmap_mode='r')
+        self.pos_p = np.load(os.path.join(path, 'pos_p.npy'), mmap_mode='r')
+        self.pos_o = np.load(os.path.join(path, 'pos_o.npy'), mmap_mode='r')
+        self.pos_s = np.load(os.path.join(path, 'pos_s.npy'), mmap_mode='r')
+
+        self.term = lru_cache(maxsize=1 << 16)(self._term)
+
+    def __len__(self):
+        return len(self.spo_s)
+
+    def __contains__(self, triple):
+        return any(True for _ in self.triples(triple))
+
+    def term_id(self, term):
+        '''
+        returns the integer id of an rdflib term, None if the term is not in the graph
+        '''
+        key = _term_key(term).encode('utf-8')
+        idx = bisect.bisect_left(self._keys, key)
+        if idx < len(self._keys) and self._keys[idx] == key:
+            return idx
+        return None
+
+    def _term(self, idx):
+        return _key_term(self._keys[int(idx)].decode('utf-8'))
+
+    def _range(self, cols, values, lo=0, hi=None):
+        '''
+        narrows [lo, hi) over sorted index columns one bound value at a time
+        '''
+        hi = len(cols[0]) if hi is None else hi
+        for col, v in zip(cols, values):
+            view = col[lo:hi]
+            lo, hi = lo + int(np.searchsorted(view, v, 'left')), lo + int(np.searchsorted(view, v, 'right'))
+            if lo == hi:
+                break
+        return lo, hi
+
+    def triples(self, triple):
+        '''
+        yields the (s, p, o) triples matching a pattern, None is a wildcard
+        '''
+        s, p, o = triple
+        ids = [None if t is None else self.term_id(t) for t in (s, p, o)]
+        if any(t is not None and i is None for t, i in zip((s, p, o), ids)):
+            return
+        si, pi, oi = ids
+
+        if si is not None:
+            bound = [si] + ([pi] if pi is not None else [])
+            if pi is not None and oi is not None:
+                bound.append(oi)
+            lo, hi = self._range((self.spo_s, self.spo_p, self.spo_o), bound)
+            rows = zip(self.spo_s[lo:hi], self.spo_p[lo:hi], self.spo_o[lo:hi])
+            for ts, tp, to in rows:
+                if oi is None or to == oi:
+                    yield self.term(ts), self.term(tp), self.term(to)
+        elif pi is not None:
+            bound = [pi] + ([oi] if oi is not None else [])
+            lo, hi = self._range((self.pos_p, self.pos_o), bound)
+            for ts, tp, to in zip(self.pos_s[lo:hi], self.pos_p[lo:hi], self.pos_o[lo:hi]):
+                yield self.term(ts), self.term(tp), self.term(to)
+        else:
+            # only the object or nothing is bound, full scan
+            for ts, tp, to in zip(self.spo_s, self.spo_p, self.spo_o):
+                if oi is None or to == oi:
+                    yield self.term(ts), self.term(tp), self.term(to)
+
+    def __iter__(self):
+        return self.triples((None, None, None))
+
+    def objects(self, subject=None, predicate=None):
+        for _, _, o in self.triples((subject, predicate, None)):
+            yield o
+
+    def subjects(self, predicate=None, object=None):
+        for s, _, _ in self.triples((None, predicate, object)):
+            yield s
+
+    def subject_objects(self, predicate=None):
+        for s, _, o in self.triples((None, predicate, None)):
+            yield s, o
+
+    def value(self, subject=None, predicate=None, object=None, default=None):
+        for s, p, o in self.triples((subject, predicate, object)):
+            if subject is None:
+                return s
+            return o if object is None else p
+        return default
+
+    def label_subjects(self, label, lang='en'):
+        '''
+        returns the entities that carry a given rdfs:label literal
+        '''
+        return list(self.subjects(rdflib.namespace.RDFS.label, rdflib.term.Literal(label, lang=lang)))
+
+
+def graph_source_path(nt_path='Data/14_graph.nt', snapshot_path='Data/kg_snapshot'):
+    '''
+    the file the graph is loaded from: the snapshot meta if compiled, the N-Triples file otherwise
+    tables derived from the graph are rebuilt when this file changes
+    '''
+    meta = os.path.join(snapshot_path, 'meta.json')
+    return meta if os.path.exists(meta) else nt_path
+
+
+def load_graph(nt_path='Data/14_graph.nt', snapshot_path='Data/kg_snapshot'):
+    '''
+    opens the compiled snapshot if it exists,
+    otherwise falls back to parsing the N-Triples file with rdflib
+    '''
+    if graph_source_path(nt_path, snapshot_path) != nt_path:
+        return KGSnapshot(snapshot_path)
+
+    print('No KG snapshot in {}, parsing {} (run kg_snapshot.py once to compile it)'.format(snapshot_path, nt_path))
+    return rdflib.Graph().parse(nt_path, format='turtle')
+
+
+if __name__ == '__main__':
+    # python kg_snapshot.py [graph.nt] [out_dir]
+    compile_snapshot(*sys.argv[1:3])
@@ -0,0 +1,61 @@
+import rdflib
+from artifact_cache import load_or_build
+
+
+# bump when the layout of the pickled table changes
+LABEL_TABLE_VERSION = 1
+
+WD = rdflib.Namespace('http://www.wikidata.org/entity/')
+
+
+def build_label_table(graph):
+    '''
+    one label per entity, the english label when there is one
+    returns the table and the set of entities that only have non english labels
+    '''
+    ent2lbl = {}
+    non_en = set()
+    for ent, lbl in graph.subject_objects(rdflib.namespace.RDFS.label):
+        if lbl.language == 'en':
+            ent2lbl[ent] = str(lbl)
+            non_en.discard(ent)
+        elif ent not in ent2lbl or ent in non_en:
+            ent2lbl[ent] = str(lbl)
+            non_en.add(ent)
+    return ent2lbl, non_en
+
+
+class LabelService:
+    '''
+    resolves entity URIs / IDs to their english labels from a precomputed table
+    shared by the bot, the intent decider and the recommenders,
+    a whole answer list costs one call and no query
+    '''
+
+    def __init__(self, graph, table_path=None, sources=None):
+        if table_path and sources:
+            self.ent2lbl, self.non_en = load_or_build(table_path, sources, LABEL_TABLE_VERSION,
+                                                      lambda: build_label_table(graph), 'label table')
+        else:
+            self.ent2lbl, self.non_en = build_label_table(graph)
+
+    def label(self, uri):
+        '''
+        english label of a URI, None if it has none
+        '''
+        if uri in self.non_en:
+            return None
+        return self.ent2lbl.get(uri)
+
+    def labels(self, uris):
+        '''
+        english labels of a list of URIs, URIs without one are skipped
+        '''
+        ent2lbl, non_en = self.ent2lbl, self.non_en
+        return [ent2lbl[u] for u in uris if u in ent2lbl and u not in non_en]
+
+    def labels_of_ids(self, ids):
+        '''
+        english labels of a list of entity IDs (e.g. Q123)
+        '''
+        return self.labels([WD[i] for i in ids])
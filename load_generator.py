@@ -0,0 +1,153 @@
+import sys
+import json
+import time
+import random
+import numpy as np
+from speakeasy_mock import MockSpeakeasy, serve
+
+
+# questions replayed when no questions file is given
+QUESTIONS = [
+    'Who is the director of Good Will Hunting?',
+    'Who directed The Bridge on the River Kwai?',
+    'Who is the screenwriter of The Masked Gang: Cyprus?',
+    'What is the MPAA film rating of Weathering with You?',
+    'What is the genre of Good Neighbors?',
+    'When was The Godfather released?',
+    'What is the box office of The Princess and the Frog?',
+    'Who is the executive producer of X-Men: First Class?',
+    'Can you tell me the publication date of Tom Meets Zizou?',
+    'Show me a picture of Halle Berry.',
+    'What does Julia Roberts look like?',
+    'Recommend movies similar to Hamlet and Othello.',
+    'Given that I like The Lion King, Pocahontas, and The Beauty and the Beast, can you recommend some movies?',
+    'Recommend me a comedy with Jim Carrey.',
+]
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.array(values)
+    return {'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+            'p90': float(np.percentile(values, 90)), 'p95': float(np.percentile(values, 95)),
+            'p99': float(np.percentile(values, 99)), 'max': float(values.max())}
+
+
+class LoadGenerator:
+    '''
+    opens n_rooms rooms in the mock and posts questions to random rooms at rate per second
+    (poisson arrivals) for duration seconds, then waits up to drain seconds for the answers
+    the bot answers a room in order, so its k-th answer in a room belongs to the k-th question;
+    its first post in a room is the greeting, '...' posts acknowledge a question
+    a room with fewer answers than questions (the bot dropped or failed one) cannot be matched,
+    its latencies are left out and it is reported under unmatched_rooms
+    '''
+
+    def __init__(self, speakeasy, questions=QUESTIONS, n_rooms=8, rate=1.0, duration=60, room_seconds=None,
+                 drain=60, seed=0):
+        self.speakeasy = speakeasy
+        self.questions = questions
+        self.n_rooms = n_rooms
+        self.rate = rate
+        self.duration = duration
+        self.room_seconds = room_seconds or duration + drain + 60
+        self.drain = drain
+        self.random = random.Random(seed)
+
+        self.rooms = []
+        self.sent = 0
+
+    def run(self):
+        self.rooms = [self.speakeasy.open_room(self.room_seconds) for _ in range(self.n_rooms)]
+
+        start = time.perf_counter()
+        arrival = start
+        while True:
+            arrival += self.random.expovariate(self.rate)
+            if arrival - start > self.duration:
+                break
+            time.sleep(max(0.0, arrival - time.perf_counter()))
+            room = self.random.choice(self.rooms)
+            self.speakeasy.add_message(room, 'user-' + room[:4], self.random.choice(self.questions))
+            self.sent += 1
+
+        drain_end = time.perf_counter() + self.drain
+        while time.perf_counter() < drain_end and self.answered() < self.sent:
+            time.sleep(0.5)
+        return self.report(start, start + self.duration)
+
+    def _room_posts(self, room):
+        messages = self.speakeasy.messages(room)
+        questions = [m for m in messages if m['authorAlias'] != self.speakeasy.bot_alias]
+        # the greeting is the first post of the bot in a room
+        posts = [m for m in messages if m['authorAlias'] == self.speakeasy.bot_alias][1:]
+        acks = [m for m in posts if m['message'] == '...']
+        answers = [m for m in posts if m['message'] != '...']
+        return questions, acks, answers
+
+    def answered(self):
+        return sum(len(self._room_posts(room)[2]) for room in self.rooms)
+
+    def report(self, start, end):
+        '''
+        end to end latency (question to answer) and acknowledgement latency (question to '...')
+        percentiles in seconds of the matched rooms, throughput in answers per second
+        from the first question to the last answer (or the end of sending)
+        '''
+        latencies, ack_latencies, unmatched = [], [], []
+        n_answers = 0
+        for room in self.rooms:
+            questions, acks, answers = self._room_posts(room)
+            n_answers += len(answers)
+            end = max([end] + [a['time'] for a in answers])
+            if len(acks) == len(questions):
+                ack_latencies += [a['time'] - q['time'] for q, a in zip(questions, acks)]
+            if len(answers) == len(questions):
+                latencies += [a['time'] - q['time'] for q, a in zip(questions, answers)]
+            else:
+                unmatched.append({'room': room, 'questions': len(questions), 'acks': len(acks),
+                                  'answers': len(answers)})
+        if unmatched:
+            print('\t\t Error: {} rooms have fewer answers than questions, '
+                  'their latencies are left out'.format(len(unmatched)))
+        seconds = end - start
+        return {'rooms': self.n_rooms,
+                'rate': self.rate,
+                'seconds': seconds,
+                'questions': self.sent,
+                'answered': n_answers,
+                'unanswered': self.sent - n_answers,
+                'throughput': n_answers / seconds if seconds else 0.0,
+                'latency_seconds': percentiles(latencies),
+                'ack_latency_seconds': percentiles(ack_latencies),
+                'matched_answers': len(latencies),
+                'unmatched_rooms': unmatched,
+                'server': dict(self.speakeasy.stats)}
+
+
+if __name__ == '__main__':
+    # python load_generator.py [questions file] [rooms] [questions per second] [seconds] [port]
+    # serves the mock Speakeasy, waits for the bot to log in (url = 'http://localhost:<port>'
+    # in Stefos_agent.py), replays the questions and writes the report to load_report.json
+    questions = QUESTIONS
+    if len(sys.argv) > 1 and sys.argv[1] != '-':
+        with open(sys.argv[1]) as f:
+            questions = [line.strip() for line in f if line.strip()]
+    n_rooms = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    duration = float(sys.argv[4]) if len(sys.argv) > 4 else 60
+    port = int(sys.argv[5]) if len(sys.argv) > 5 else 8000
+
+    speakeasy = MockSpeakeasy()
+    httpd = serve(speakeasy, port)
+    print('Mock Speakeasy on http://localhost:{}, waiting for the bot to log in...'.format(port))
+    speakeasy.logged_in.wait()
+
+    print('Sending {:.1f} questions per second to {} rooms for {:.0f}s...'.format(rate, n_rooms, duration))
+    report = LoadGenerator(speakeasy, questions, n_rooms, rate, duration).run()
+    httpd.shutdown()
+
+    with open('load_report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
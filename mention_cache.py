@@ -0,0 +1,187 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+from artifact_cache import source_stamp, file_lock
+
+
+# bump when the layout of the store changes
+MENTION_CACHE_VERSION = 1
+
+
+class MentionCache:
+    '''
+    cache of entity mention embeddings and the entity they were resolved to
+    an in memory LRU in front of an append only store on disk:
+    vectors.bin (float32 rows, memory mapped), mentions.jsonl ([mention, entity] per row)
+    and meta.json; the store is reset when the sources (title embeddings,
+    encoder) it was computed from change
+    several processes can share a store, appends are serialized with a file lock
+    and pick up the rows the other processes appended
+    '''
+
+    def __init__(self, path, dim, sources=(), lru_size=4096):
+        self.path = path
+        self.dim = dim
+        self.lru_size = lru_size
+
+        self.stats = {'lru': 0, 'disk': 0, 'misses': 0, 'stores': 0}
+
+        self._lru = OrderedDict()
+        self._rows = {}
+        self._mentions = []
+        self._entities = []
+        self._mentions_offset = 0
+        self._vectors = None
+        self._lock = threading.Lock()
+
+        self._vectors_path = os.path.join(path, 'vectors.bin')
+        self._mentions_path = os.path.join(path, 'mentions.jsonl')
+        self._meta = {'version': MENTION_CACHE_VERSION, 'dim': dim, 'sources': source_stamp(sources)}
+
+        os.makedirs(path, exist_ok=True)
+        self._open()
+
+    def _file_lock(self):
+        return file_lock(os.path.join(self.path, 'lock'))
+
+    def _open(self):
+        with self._file_lock():
+            meta_path = os.path.join(self.path, 'meta.json')
+            meta = None
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            # json turns the stamp tuples into lists, compare in the same form
+            if meta != json.loads(json.dumps(self._meta)):
+                for p in (self._vectors_path, self._mentions_path):
+                    if os.path.exists(p):
+                        os.remove(p)
+                with open(meta_path, 'w') as f:
+                    json.dump(self._meta, f)
+                return
+
+            self._read_rows()
+
+            # an interrupted append leaves rows without their vector (or the other way round),
+            # both files are cut back to the complete rows so new rows stay aligned
+            n = os.path.getsize(self._vectors_path) // (4 * self.dim) if os.path.exists(self._vectors_path) else 0
+            n = min(n, len(self._entities))
+            if n < len(self._entities) or n * 4 * self.dim != self._vectors_size() \
+                    or self._mentions_offset != self._mentions_size():
+                del self._mentions[n:]
+                del self._entities[n:]
+                self._rows = {m: r for m, r in self._rows.items() if r < n}
+                with open(self._vectors_path, 'ab') as f:
+                    f.truncate(n * 4 * self.dim)
+                with open(self._mentions_path, 'wb') as f:
+                    for m, ent in zip(self._mentions, self._entities):
+                        f.write((json.dumps([m, ent]) + '\n').encode('utf-8'))
+                    self._mentions_offset = f.tell()
+
+        self._map()
+        print('Loaded {} cached mention embeddings'.format(len(self._entities)))
+
+    def _vectors_size(self):
+        return os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+
+    def _mentions_size(self):
+        return os.path.getsize(self._mentions_path) if os.path.exists(self._mentions_path) else 0
+
+    def _read_rows(self):
+        '''
+        reads the rows appended to mentions.jsonl since the last read
+        '''
+        if not os.path.exists(self._mentions_path):
+            return
+        with open(self._mentions_path, 'rb') as f:
+            f.seek(self._mentions_offset)
+            for line in f:
+                try:
+                    mention, ent = json.loads(line)
+                except ValueError:
+                    # partly written last row
+                    break
+                self._rows.setdefault(mention, len(self._entities))
+                self._mentions.append(mention)
+                self._entities.append(ent)
+                self._mentions_offset += len(line)
+
+    def _map(self):
+        n = len(self._entities)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(n, self.dim)) if n else None
+
+    def __len__(self):
+        return len(self._entities)
+
+    def __contains__(self, mention):
+        return mention in self._lru or mention in self._rows
+
+    def get(self, mention):
+        '''
+        (vector, entity) of a mention, None if it was never stored
+        '''
+        with self._lock:
+            entry = self._lru.get(mention)
+            if entry is not None:
+                self._lru.move_to_end(mention)
+                self.stats['lru'] += 1
+                return entry
+
+            row = self._rows.get(mention)
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            if self._vectors is None or row >= len(self._vectors):
+                self._map()
+            entry = (np.array(self._vectors[row]), self._entities[row])
+            self._remember(mention, entry)
+            self.stats['disk'] += 1
+            return entry
+
+    def put(self, mention, vector, entity):
+        self.put_batch([mention], [vector], [entity])
+
+    def put_batch(self, mentions, vectors, entities):
+        '''
+        appends new mentions to the store, already stored mentions are skipped
+        '''
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(mentions), self.dim)
+        with self._lock:
+            with self._file_lock():
+                # rows other processes appended since the last read
+                self._read_rows()
+
+                new, seen = [], set()
+                for i, m in enumerate(mentions):
+                    if m not in self._rows and m not in seen:
+                        seen.add(m)
+                        new.append(i)
+                if not new:
+                    return
+
+                with open(self._vectors_path, 'ab') as f:
+                    f.write(vectors[new].tobytes())
+                with open(self._mentions_path, 'ab') as f:
+                    for i in new:
+                        line = (json.dumps([mentions[i], entities[i]]) + '\n').encode('utf-8')
+                        f.write(line)
+                        self._mentions_offset += len(line)
+
+            for i in new:
+                self._rows[mentions[i]] = len(self._entities)
+                self._mentions.append(mentions[i])
+                self._entities.append(entities[i])
+                self._remember(mentions[i], (vectors[i], entities[i]))
+            self.stats['stores'] += len(new)
+
+    def _remember(self, mention, entry):
+        self._lru[mention] = entry
+        self._lru.move_to_end(mention)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.stats['lru'] + self.stats['disk'] + self.stats['misses']
+        return (self.stats['lru'] + self.stats['disk']) / lookups if lookups else 0.0
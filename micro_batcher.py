@@ -0,0 +1,72 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    '''
+    collects items submitted from several threads and processes them in batches
+    a batch is run when max_batch_size items are waiting or max_wait seconds
+    passed since its first item, results are handed back through futures
+    '''
+
+    def __init__(self, process_batch, max_batch_size=16, max_wait=0.05, name='micro-batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.stats = {'batches': 0, 'items': 0, 'seconds': 0.0}
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        '''
+        queue an item, returns a Future with its result
+        '''
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self):
+        '''
+        blocks for the first item, then waits up to max_wait for more
+        '''
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+
+            start = time.perf_counter()
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.stats['batches'] += 1
+            self.stats['items'] += len(items)
+            self.stats['seconds'] += time.perf_counter() - start
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def mean_batch_size(self):
+        return self.stats['items'] / self.stats['batches'] if self.stats['batches'] else 0.0
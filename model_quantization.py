@@ -0,0 +1,161 @@
+import io
+import sys
+import time
+import numpy as np
+import torch
+
+
+# layers replaced by their int8 dynamic quantized versions
+QUANTIZED_LAYERS = {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU}
+
+
+def quantize_dynamic(model):
+    '''
+    int8 weights for the linear and recurrent layers, activations are quantized on the fly
+    '''
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, QUANTIZED_LAYERS, dtype=torch.qint8)
+
+
+def load_tagger(path, quantize=False):
+    '''
+    flair sequence tagger, int8 quantized if quantize
+    '''
+    from flair.models import SequenceTagger
+    if quantize:
+        return quantize_dynamic(SequenceTagger.load(path))
+    return SequenceTagger.load(path)
+
+
+def load_sentence_encoder(path, quantize=False):
+    '''
+    sentence transformer, int8 quantized if quantize
+    '''
+    from sentence_transformers import SentenceTransformer
+    if quantize:
+        return quantize_dynamic(SentenceTransformer(path, device='cpu'))
+    return SentenceTransformer(path)
+
+
+def model_bytes(model):
+    '''
+    serialized size of the model weights
+    '''
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def _f1(reference, predicted):
+    '''
+    micro F1 of predicted against reference items (sets per sentence)
+    '''
+    tp = sum(len(r & p) for r, p in zip(reference, predicted))
+    n_ref = sum(len(r) for r in reference)
+    n_pred = sum(len(p) for p in predicted)
+    if n_ref == 0 and n_pred == 0:
+        return 1.0
+    precision = tp / n_pred if n_pred else 0.0
+    recall = tp / n_ref if n_ref else 0.0
+    return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+
+def _tag(model, questions, label_name):
+    '''
+    tags every question on its own (like the bot does) and returns
+    the mean seconds per question and the labelled spans / tokens per question
+    '''
+    from flair.data import Sentence
+
+    items = []
+    start = time.perf_counter()
+    for q in questions:
+        sentence = Sentence(q)
+        model.predict(sentence, label_name=label_name)
+        if label_name == 'pos':
+            items.append({(i, token.get_labels('pos')[0].value) for i, token in enumerate(sentence)})
+        else:
+            items.append({(span.start_position, span.end_position, span.get_labels(label_name)[0].value)
+                          for span in sentence.get_spans(label_name)})
+    return (time.perf_counter() - start) / len(questions), items
+
+
+def compare_tagger(path, questions, label_name):
+    '''
+    fp32 vs int8 of a tagger, the fp32 predictions are the reference for the F1
+    '''
+    fp32 = load_tagger(path)
+    int8 = load_tagger(path, quantize=True)
+    fp32_seconds, reference = _tag(fp32, questions, label_name)
+    int8_seconds, predicted = _tag(int8, questions, label_name)
+    return {'model': path, 'f1': _f1(reference, predicted),
+            'fp32_ms': 1e3 * fp32_seconds, 'int8_ms': 1e3 * int8_seconds,
+            'fp32_mb': model_bytes(fp32) / 2**20, 'int8_mb': model_bytes(int8) / 2**20}
+
+
+def compare_encoder(path, mentions):
+    '''
+    fp32 vs int8 of the sentence encoder: cosine similarity of the mention embeddings
+    '''
+    fp32 = load_sentence_encoder(path)
+    int8 = load_sentence_encoder(path, quantize=True)
+
+    res = {'model': path}
+    embs = {}
+    for name, model in (('fp32', fp32), ('int8', int8)):
+        start = time.perf_counter()
+        embs[name] = np.asarray([model.encode(m) for m in mentions])
+        res[name + '_ms'] = 1e3 * (time.perf_counter() - start) / len(mentions)
+        res[name + '_mb'] = model_bytes(model) / 2**20
+
+    a = embs['fp32'] / np.linalg.norm(embs['fp32'], axis=1, keepdims=True)
+    b = embs['int8'] / np.linalg.norm(embs['int8'], axis=1, keepdims=True)
+    cosine = (a * b).sum(axis=1)
+    res['mean_cosine'] = float(cosine.mean())
+    res['min_cosine'] = float(cosine.min())
+    return res
+
+
+# fixed question set of the accuracy comparison
+QUESTIONS = [
+    'Who is the director of Good Will Hunting',
+    'Who directed The Bridge on the River Kwai',
+    'Who is the director of Star Wars: Episode VI - Return of the Jedi',
+    'Who is the screenwriter of The Masked Gang: Cyprus',
+    'What is the MPAA film rating of Weathering with You',
+    'What is the genre of Good Neighbors',
+    'When was The Godfather released',
+    'Where was The Lord of the Rings filmed',
+    'What is the box office of The Princess and the Frog',
+    'Can you tell me the publication date of Tom Meets Zizou',
+    'Who is the executive producer of X-Men: First Class',
+    'Show me a picture of Halle Berry',
+    'What does Julia Roberts look like',
+    'Let me know what Sandra Bullock looks like',
+    'Recommend movies similar to Hamlet and Othello',
+    'Given that I like The Lion King, Pocahontas, and The Beauty and the Beast, can you recommend some movies',
+    'Recommend movies like Nightmare on Elm Street, Friday the 13th, and Halloween',
+    'Can you recommend a scary movie with Tom Hanks',
+    'Who is the cast member of Titanic',
+    'What is the country of origin of Parasite',
+]
+
+MENTIONS = [
+    'Good Will Hunting', 'The Bridge on the River Kwai', 'Star Wars Return of the Jedi',
+    'Weathering with you', 'the godfather', 'Lord of the Rings', 'Princess and the Frog',
+    'Halle Berry', 'julia roberts', 'Sandra Bulock', 'Hamlet', 'Nightmare on Elm Street',
+    'Friday the 13th', 'Tom Hanks', 'Titanic', 'Parasite',
+]
+
+
+if __name__ == '__main__':
+    # python model_quantization.py [questions file, one per line]
+    # quantizes the four models and compares them with the fp32 models
+    questions = QUESTIONS
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    for path, label_name in (('models/ner_large', 'ner_large'), ('models/ner_base', 'ner_base'), ('models/pos1', 'pos')):
+        print(compare_tagger(path, questions, label_name))
+    print(compare_encoder('models/ent_name_sim/', MENTIONS))
@@ -0,0 +1,65 @@
+import re
+import numpy as np
+from artifact_cache import load_or_build
+from wikidata import WDT, q_number
+
+
+# bump when the layout of the pickled table changes
+MOVIE_METADATA_VERSION = 1
+
+
+def build_year_table(graph):
+    '''
+    earliest publication date (P577) year of every entity
+    returns two arrays sorted by entity number: Q numbers and years
+    '''
+    earliest = {}
+    for ent, date in graph.subject_objects(WDT.P577):
+        q, date = q_number(ent), str(date)
+        if q is None:
+            continue
+        if q not in earliest or date < earliest[q]:
+            earliest[q] = date
+
+    qs, years = [], []
+    for q in sorted(earliest):
+        year = re.match(r'\d+', earliest[q])
+        if year:
+            qs.append(q)
+            years.append(int(year[0]))
+
+    return np.array(qs, dtype=np.int64), np.array(years, dtype=np.int16)
+
+
+class MovieMetadata:
+    '''
+    per film metadata precomputed from the graph
+    release year lookups are a binary search over two small arrays
+    '''
+
+    def __init__(self, graph, table_path=None, sources=None):
+        if table_path and sources:
+            self.qs, self.release_years = load_or_build(table_path, sources, MOVIE_METADATA_VERSION,
+                                                        lambda: build_year_table(graph), 'movie metadata')
+        else:
+            self.qs, self.release_years = build_year_table(graph)
+
+    def years(self, ent_ids):
+        '''
+        release years of a list of entity IDs (e.g. Q123), None where unknown
+        '''
+        if not len(self.qs):
+            return [None] * len(ent_ids)
+        nums = np.array([int(e[1:]) if e[:1] == 'Q' and e[1:].isdigit() else -1 for e in ent_ids], dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.qs, nums), len(self.qs) - 1)
+        found = self.qs[pos] == nums
+        return [int(y) if f else None for y, f in zip(self.release_years[pos], found)]
+
+    def year(self, ent_id):
+        return self.years([ent_id])[0]
+
+    def year_suffixes(self, ent_ids):
+        '''
+        ' (year)' decoration for a list of entities, '' where unknown
+        '''
+        return [f" ({y})" if y is not None else '' for y in self.years(ent_ids)]
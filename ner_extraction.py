@@ -1,50 +1,103 @@
+import os
 import re
-from flair.data import Sentence
-from flair.models import SequenceTagger
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics import pairwise_distances
+import time
 import json
-import numpy as np
+from embedding_store import EmbeddingStore
+from entity_linker import EntityLinker
+from mention_cache import MentionCache
+from model_quantization import load_tagger, load_sentence_encoder
+from startup_profiler import profile_section
 
 
 class NER_extractor:
-    def __init__(self):
+    def __init__(self, embedding_store=None, mode='both', cascade_min_score=0.9, cascade_require_link=True,
+                 quantize=False):
+        '''
+        mode 'both' runs ner_large and ner_base on every message
+        mode 'cascade' runs ner_base first and escalates to ner_large only when
+        base finds no entity, scores a span below cascade_min_score or
+        (cascade_require_link) a mention misses the exact name lookup
+        quantize loads the models int8 dynamic quantized
+        '''
+
+        self.mode = mode
+        self.cascade_min_score = cascade_min_score
+        self.cascade_require_link = cascade_require_link
+
+        # escalation and per model latency counters
+        self.stats = {'messages': 0, 'escalations': 0,
+                      'ner_base': {'calls': 0, 'seconds': 0.0},
+                      'ner_large': {'calls': 0, 'seconds': 0.0}}
 
         print('Loading NER models...')
-        self.ner_large = SequenceTagger.load('models/ner_large')
-        self.ner_base = SequenceTagger.load('models/ner_base')
+        with profile_section('ner_large'):
+            self.ner_large = load_tagger('models/ner_large', quantize)
+        with profile_section('ner_base'):
+            self.ner_base = load_tagger('models/ner_base', quantize)
 
         print('Loading Entity name similarity model...')
-        self.ent_name_sim_model = SentenceTransformer('models/ent_name_sim/')
+        with profile_section('ent_name_sim'):
+            self.ent_name_sim_model = load_sentence_encoder('models/ent_name_sim/', quantize)
 
         print('Loading Title embeddings')
-        with open("Data/titles.json", "r") as f:
-            self.ent_codes = json.load(f)
+        with profile_section('title_embeddings'):
+            with open("Data/titles.json", "r") as f:
+                self.ent_codes = json.load(f)
+
+            self.embedding_store = embedding_store if embedding_store is not None else EmbeddingStore()
+            self.title_embeddings = self.embedding_store.load('title', 'Data/title_embeddings.npy')
+
+        with profile_section('entity_name_maps'):
+            with open("Data/ent2name.json", "r") as f:
+                self.ent2name = json.load(f)
 
-        self.title_embeddings = np.load('Data/title_embeddings.npy')
+            with open("Data/name2ent.json", "r") as f:
+                self.name2ent = json.load(f)
 
-        with open("Data/ent2name.json", "r") as f:
-            self.ent2name = json.load(f)
+        # transformer results of earlier mentions, kept across restarts (per model variant)
+        # and reset when the title index they were resolved with is built or rebuilt
+        title_index_meta = os.path.join('Data/title_ivf', 'meta.json')
+        sources = ['Data/title_embeddings.npy', 'Data/titles.json']
+        if os.path.exists(title_index_meta):
+            sources.append(title_index_meta)
+        with profile_section('mention_cache'):
+            self.mention_cache = MentionCache('Data/mention_cache_int8' if quantize else 'Data/mention_cache',
+                                              self.title_embeddings.shape[1], sources)
 
-        with open("Data/name2ent.json", "r") as f:
-            self.name2ent = json.load(f)
+        # exact name fast path, mention cache, title index (python vector_search.py ...) for the rest
+        with profile_section('title_index'):
+            self.entity_linker = EntityLinker(self.ent_name_sim_model, self.ent_codes, self.title_embeddings,
+                                              self.ent2name, self.name2ent, 'Data/title_ivf', self.mention_cache)
 
 
-    def _get_model_res(self, model, text):
+    def _get_model_res_batch(self, model, texts, sentences, name):
         '''
-        run a model to identify NER and Other words
-        Only person and movies are accepted
+        runs a model to identify the person and movie entities (with their confidence scores)
+        and Other words of already tokenized texts with one batched forward pass
+        the labels are stored under the model name, so several taggers can share a Sentence
         '''
 
-        sentence = Sentence(text)
-        model.predict(sentence)
+        start = time.perf_counter()
+        model.predict(sentences, mini_batch_size=max(len(sentences), 1), label_name=name)
+        self.stats[name]['calls'] += 1
+        self.stats[name]['seconds'] += time.perf_counter() - start
+
+        return [self._split_entities(text, sentence, name) for text, sentence in zip(texts, sentences)]
+
+    def _split_entities(self, text, sentence, label_name='ner'):
+        '''
+        splits a tagged sentence into entity words and Other words
+        '''
 
         Owords = []
         ent_words = []
+        scores = []
         idx = []
-        for entity in sentence.get_spans('ner'):
-            if entity.get_labels('ner')[0].value in ['PER', 'MISC']:
+        for entity in sentence.get_spans(label_name):
+            label = entity.get_labels(label_name)[0]
+            if label.value in ['PER', 'MISC']:
                 ent_words.append(text[entity.start_position:entity.end_position])
+                scores.append(label.score)
                 idx.append((entity.start_position,entity.end_position))
 
         if len(idx) == 1:
@@ -59,36 +112,76 @@ class NER_extractor:
                 if i == len(idx)-1:
                     Owords.append(text[v[1]:])
 
-        return  ent_words, Owords
+        return  ent_words, Owords, scores
 
-    def get_entities(self, text):
+    def _base_is_enough(self, ent_words, scores):
+        '''
+        cascade gate, True if the ner_base result can be used without running ner_large
         '''
-        Method to run NER models on input Text
-        Uses 2 ner models large and base sized, for backup
+        if not ent_words:
+            return False
+        if min(scores) < self.cascade_min_score:
+            return False
+        if self.cascade_require_link:
+            return all(self.entity_linker.fast_lookup(e) is not None for e in ent_words)
+        return True
+
+    def cascade_stats(self):
         '''
-        if text[-1] == '?' or text[-1] == '.':
-            text = text[:-1]
+        escalation rate and mean latency per model
+        '''
+        res = {'messages': self.stats['messages'],
+               'escalation_rate': self.stats['escalations'] / self.stats['messages'] if self.stats['messages'] else 0.0}
+        for name in ['ner_base', 'ner_large']:
+            calls = self.stats[name]['calls']
+            res[name + '_calls'] = calls
+            res[name + '_mean_ms'] = 1000 * self.stats[name]['seconds'] / calls if calls else 0.0
+        return res
 
+    def tag_entities(self, texts, sentences):
+        '''
+        runs the NER models over already tokenized (end punctuation stripped) texts
+        each model runs once over the whole batch, in cascade mode
+        the large model runs once over the texts that were escalated
+        returns (entity words, Owords) per text
+        '''
 
-        ent_words1, Owords1 = self._get_model_res(self.ner_large, text)
-        ent_words2, Owords2 = self._get_model_res(self.ner_base, text)
+        self.stats['messages'] += len(texts)
 
-        if len(ent_words1) > len(ent_words2) and ent_words2:
-            word_group = ent_words2
-            Owords = Owords2
+        base_res = self._get_model_res_batch(self.ner_base, texts, sentences, 'ner_base')
+        if self.mode == 'cascade':
+            escalate = [i for i, (ent_words, _, scores) in enumerate(base_res)
+                        if not self._base_is_enough(ent_words, scores)]
+            self.stats['escalations'] += len(escalate)
         else:
-            word_group = ent_words1
-            Owords = Owords1
+            escalate = list(range(len(texts)))
+
+        large_res = list(base_res)
+        if escalate:
+            escalated = self._get_model_res_batch(self.ner_large, [texts[i] for i in escalate],
+                                                  [sentences[i] for i in escalate], 'ner_large')
+            for i, r in zip(escalate, escalated):
+                large_res[i] = r
+
+        res = []
+        for text, (ent_words1, Owords1, _), (ent_words2, Owords2, _) in zip(texts, large_res, base_res):
+            if len(ent_words1) > len(ent_words2) and ent_words2:
+                word_group = ent_words2
+                Owords = Owords2
+            else:
+                word_group = ent_words1
+                Owords = Owords1
 
 
-        print()
-        print('NER')
-        print(Owords)
-        print(word_group)
-        print()
+            print()
+            print('NER')
+            print(Owords)
+            print(word_group)
+            print()
 
+            res.append((word_group, Owords if word_group else [text]))
 
-        return  word_group, Owords if word_group else [text]
+        return res
 
 
 
@@ -123,17 +216,14 @@ class NER_extractor:
 
         # entities_ids = self._EntityURI_to_ID( URI_LIST, WD)
 
-        # embed for input entity
-        inp_emb = self.ent_name_sim_model.encode(ent)
+        return self._name_to_URI_ID(graph, self.entity_linker.link(ent), WDT, WD, cat2id)
 
-        # calculate nearest answer
-        dist = pairwise_distances(inp_emb.reshape(1, -1),
-                                  self.title_embeddings).reshape(-1)
-        most_likely = dist.argsort()
-        most_likely_ent = self.ent_codes[most_likely[0]]
+    def _name_to_URI_ID(self, graph, name, WDT, WD, cat2id):
+        '''
+        returns the URI IDs of an entity name, grouped by human or film type
+        '''
 
         #check if other entities exist with the same name
-        name = self.ent2name[most_likely_ent]
         entities_ids = self.name2ent[name]
 
         # filter non movie occupation for PERsons
@@ -161,8 +251,8 @@ class NER_extractor:
         '''
 
         qres = []
-        for e in entities:
-            uri_res = self._getEntity_URI_ID(graph, e, WDT, WD, cat2id)
+        for name in self.entity_linker.link_batch(entities):
+            uri_res = self._name_to_URI_ID(graph, name, WDT, WD, cat2id)
             qres.append(uri_res)
 
         entities_uriID = {}
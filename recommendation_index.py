@@ -0,0 +1,79 @@
+import random
+import numpy as np
+from artifact_cache import load_or_build
+from wikidata import WD, WDT, q_number
+
+
+# bump when the layout of the pickled index changes
+RECOMMENDATION_INDEX_VERSION = 1
+
+
+def _posting_lists(pairs):
+    '''
+    (key, movie) pairs to CSR posting lists:
+    sorted keys, offsets into postings, and per key sorted unique movies
+    '''
+    if not pairs:
+        return np.zeros(0, np.int64), np.zeros(1, np.int64), np.zeros(0, np.int64)
+
+    arr = np.unique(np.array(pairs, dtype=np.int64), axis=0)
+    keys, starts = np.unique(arr[:, 0], return_index=True)
+    offsets = np.append(starts, len(arr)).astype(np.int64)
+    return keys, offsets, arr[:, 1].copy()
+
+
+def build_recommendation_index(graph, label_service):
+    '''
+    genre -> movies (P136) and cast member -> movies (P161) posting lists
+    only movies with an english label are kept, as those are the ones that can be printed
+    '''
+    index = {}
+    for name, prop in [('genre', WDT.P136), ('actor', WDT.P161)]:
+        pairs = []
+        for movie, key in graph.subject_objects(prop):
+            m, k = q_number(movie), q_number(key)
+            if m is not None and k is not None and label_service.label(movie) is not None:
+                pairs.append((k, m))
+        index[name] = _posting_lists(pairs)
+    return index
+
+
+class RecommendationIndex:
+    '''
+    posting lists of movies per genre and per cast member as sorted integer arrays
+    single list picks are uniform O(1) samples, actor + genre intersects two lists
+    '''
+
+    def __init__(self, graph, label_service, table_path=None, sources=None):
+        if table_path and sources:
+            self.index = load_or_build(table_path, sources, RECOMMENDATION_INDEX_VERSION,
+                                       lambda: build_recommendation_index(graph, label_service),
+                                       'recommendation index')
+        else:
+            self.index = build_recommendation_index(graph, label_service)
+
+    def movies(self, kind, ent_id):
+        '''
+        sorted Q numbers of the movies of a genre or actor ('genre' / 'actor')
+        '''
+        keys, offsets, postings = self.index[kind]
+        q = q_number(WD[ent_id])
+        pos = np.searchsorted(keys, q) if q is not None else len(keys)
+        if pos == len(keys) or keys[pos] != q:
+            return postings[:0]
+        return postings[offsets[pos]:offsets[pos + 1]]
+
+    def _sample(self, movies):
+        if not len(movies):
+            return None
+        return 'Q{}'.format(movies[random.randrange(len(movies))])
+
+    def sample_genre(self, genre):
+        return self._sample(self.movies('genre', genre))
+
+    def sample_actor(self, actor):
+        return self._sample(self.movies('actor', actor))
+
+    def sample_actor_genre(self, actor, genre):
+        return self._sample(np.intersect1d(self.movies('actor', actor), self.movies('genre', genre),
+                                           assume_unique=True))
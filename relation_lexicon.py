@@ -0,0 +1,83 @@
+import sys
+import pandas as pd
+from artifact_cache import load_or_build
+from relation_vocabulary import NOUN_MAPPER, surface_relations
+
+
+# bump when the layout of the pickled lexicon or the build rules change
+RELATION_LEXICON_VERSION = 1
+
+
+def build_relation_lexicon(noun_mapper, film_properties):
+    '''
+    offline build of the surface form -> relation lexicon
+    verb: verb forms whose word_forms noun conversions hit a relation noun
+    noun: the relation nouns themselves
+    plural: plural forms that inflect singularizes to a relation noun
+    '''
+    # only needed here, the bot itself makes no NLP library calls for relations
+    from word_forms.word_forms import get_word_forms
+    import inflect
+
+    inflect_engine = inflect.engine()
+    surface2relation = surface_relations(noun_mapper, film_properties)
+    properties = set(surface2relation)
+
+    # verbs related to any relation noun, and all their inflections
+    candidates = set()
+    for noun in properties:
+        candidates.update(get_word_forms(noun)['v'])
+    for verb in list(candidates):
+        candidates.update(get_word_forms(verb)['v'])
+
+    # same conversion the relation extraction did per message: verb -> noun forms -> relations
+    verb = {}
+    for v in candidates:
+        v = v.lower()
+        matching_conversions = properties.intersection(get_word_forms(v)['n'])
+        if matching_conversions:
+            verb[v] = sorted({surface2relation[n] for n in matching_conversions})
+
+    plural = {}
+    for noun in properties:
+        p = inflect_engine.plural_noun(noun)
+        if p and inflect_engine.singular_noun(p) == noun:
+            plural.setdefault(p, surface2relation[noun])
+
+    return {'verb': verb, 'noun': surface2relation, 'plural': plural}
+
+
+class RelationLexicon:
+    '''
+    precomputed surface form -> film property lexicon
+    relation extraction is dictionary lookups, word_forms and inflect only run when (re)building
+    '''
+
+    def __init__(self, noun_mapper, film_properties, lexicon_path=None, sources=None):
+        version = [RELATION_LEXICON_VERSION, sorted((k, sorted(v)) for k, v in noun_mapper.items())]
+        if lexicon_path and sources:
+            self.lexicon = load_or_build(lexicon_path, sources, version,
+                                         lambda: build_relation_lexicon(noun_mapper, film_properties),
+                                         'relation lexicon')
+        else:
+            self.lexicon = build_relation_lexicon(noun_mapper, film_properties)
+
+    def verb_relations(self, verb):
+        '''
+        relations a (lower cased) verb converts to, [] if none
+        '''
+        return self.lexicon['verb'].get(verb, [])
+
+    def noun_relation(self, noun, plural=False):
+        '''
+        relation of a (lower cased) noun, plural nouns are singularized first, None if none
+        '''
+        return self.lexicon['plural' if plural else 'noun'].get(noun)
+
+
+if __name__ == '__main__':
+    # python relation_lexicon.py [film properties csv] [lexicon path]
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'Data/Film Properties.csv'
+    lexicon_path = sys.argv[2] if len(sys.argv) > 2 else 'Data/relation_lexicon.pkl'
+    lexicon = RelationLexicon(NOUN_MAPPER, set(pd.read_csv(csv_path)['res']), lexicon_path, [csv_path])
+    print({k: len(v) for k, v in lexicon.lexicon.items()})
@@ -0,0 +1,86 @@
+import rdflib
+from artifact_cache import load_or_build
+
+
+# bump when the layout of the pickled table changes
+RELATION_VOCABULARY_VERSION = 1
+
+WDT = rdflib.Namespace('http://www.wikidata.org/prop/direct/')
+
+# noun mapper to film properties
+NOUN_MAPPER = {
+    'cast member' : set(['actor', 'actress', 'cast']),
+    'genre': set(['type', 'kind']),
+    'publication date': set(['release', 'date', 'airdate', 'publication', 'launch', 'broadcast']),
+    'executive producer': set(['showrunner']),
+    'screenwriter': set(['scriptwriter', 'screenplay', 'teleplay', 'writer', 'script', 'scenarist', 'story']),
+    'director of photography': set(['cinematographer', 'DOP', 'dop']),
+    'film editor': set(['editor']),
+    'production designer': set(['designer']),
+    'box office': set(['box', 'office', 'funding']),
+    'cost': set(['budget', 'cost']),
+    'nominated for': set(['nomination', 'award', 'finalist', 'shortlist', 'selection']),
+    'costume designer': set(['costume']),
+    'official website' : set(['website', 'site']),
+    'filming location' : set(['flocation']),
+    'narrative website' : set(['nlocation']),
+    'production company' : set(['company']),
+    'country of origin': set(['origin', 'country'])
+}
+
+
+def surface_relations(noun_mapper, film_properties):
+    '''
+    surface noun -> canonical relation
+    film properties are relations themselves and win over the synonyms
+    '''
+    surface2relation = {}
+    for k, v in noun_mapper.items():
+        for w in v:
+            surface2relation.setdefault(w, k)
+    for p in film_properties:
+        if isinstance(p, str):
+            surface2relation[p] = p
+    return surface2relation
+
+
+def build_relation_labels(graph):
+    '''
+    english label -> property IDs of every wdt: property in the graph
+    '''
+    label2ids = {}
+    for prop, lbl in graph.subject_objects(rdflib.namespace.RDFS.label):
+        if str(prop).startswith(WDT) and getattr(lbl, 'language', None) == 'en':
+            ids = label2ids.setdefault(str(lbl), [])
+            if str(prop)[len(WDT):] not in ids:
+                ids.append(str(prop)[len(WDT):])
+    return label2ids
+
+
+class RelationVocabulary:
+    '''
+    precomputed relation vocabulary
+    maps relations (film property labels) to their WDT property IDs
+    relation resolution is a dictionary lookup instead of a graph query
+    '''
+
+    def __init__(self, graph, table_path=None, sources=None):
+        if table_path and sources:
+            self.label2ids = load_or_build(table_path, sources, RELATION_VOCABULARY_VERSION,
+                                           lambda: build_relation_labels(graph), 'relation vocabulary')
+        else:
+            self.label2ids = build_relation_labels(graph)
+
+        # lower cased fallback for labels, first label wins
+        self.norm2ids = {}
+        for lbl, ids in self.label2ids.items():
+            self.norm2ids.setdefault(lbl.lower(), ids)
+
+    def relation_ids(self, relation):
+        '''
+        WDT property IDs (e.g. P57) whose english label is the relation
+        '''
+        ids = self.label2ids.get(relation)
+        if ids is None:
+            ids = self.norm2ids.get(relation.lower(), [])
+        return list(ids)
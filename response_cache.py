@@ -0,0 +1,112 @@
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+from artifact_cache import source_stamp, atomic_write
+from text_utils import strip_end_punctuation
+
+
+# bump when the layout of the persisted cache or the answers change
+RESPONSE_CACHE_VERSION = 1
+
+
+def normalize_question(message):
+    '''
+    cache key of a message: surrounding / repeated whitespace and the final ? or . removed
+    the case is kept, the entity recognition is case sensitive
+    '''
+    return strip_end_punctuation(' '.join(message.split())).strip()
+
+
+class ResponseCache:
+    '''
+    bounded LRU cache of final answers keyed by the normalized question
+    entries expire ttl seconds after they were stored
+    with a path the cache is saved on save() and loaded again on start,
+    unless the sources the answers came from (graph, crowd data) changed
+    '''
+
+    def __init__(self, max_size=1024, ttl=3600, path=None, sources=()):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.sources = list(sources)
+
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'stores': 0}
+
+        # key -> (stored at, response), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.path:
+            self.load()
+
+    def get(self, message):
+        '''
+        cached response of a message, None if there is none (or it expired)
+        '''
+        key = normalize_question(message)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, message, response):
+        key = normalize_question(message)
+        with self._lock:
+            self._entries[key] = (time.time(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self.stats['stores'] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def load(self):
+        '''
+        loads the saved entries that did not expire yet
+        '''
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                saved = pickle.load(f)
+        except Exception as e:
+            print('\t\t Error: could not read {} ({}), starting with an empty cache'.format(self.path, e))
+            return
+        if saved['version'] != RESPONSE_CACHE_VERSION or saved['sources'] != source_stamp(self.sources):
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, (stored, response) in saved['entries']:
+                if now - stored <= self.ttl:
+                    self._entries[key] = (stored, response)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        print('Loaded {} cached responses'.format(len(self._entries)))
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+
+        atomic_write(self.path, lambda f: pickle.dump({'version': RESPONSE_CACHE_VERSION,
+                                                       'sources': source_stamp(self.sources),
+                                                       'entries': entries}, f, protocol=pickle.HIGHEST_PROTOCOL))
@@ -0,0 +1,104 @@
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+
+
+class DeadlineExpired(RuntimeError):
+    pass
+
+
+class DeadlineScheduler:
+    '''
+    runs fn(message, fast) of the pending messages on n_threads threads, earliest due first
+    a message is due at the deadline of its room or target_latency seconds after it was
+    queued, whichever is earlier, so rooms about to end go first and old messages are not starved
+    a message whose room ends before it could be answered in fast mode is shed (DeadlineExpired),
+    one that cannot be answered in full before the deadline is answered with fast=True
+    the full / fast service times are estimated from the answered messages
+    '''
+
+    def __init__(self, n_threads, target_latency=30.0, service_estimate=2.0, window=1000, name='scheduler'):
+        self.target_latency = target_latency
+
+        self.stats = {'submitted': 0, 'answered': 0, 'degraded': 0, 'shed': 0, 'errors': 0, 'max_depth': 0}
+        # moving average of the service time per mode
+        self.estimates = {'full': service_estimate, 'fast': 0.0}
+
+        self._heap = []
+        self._ids = itertools.count()
+        self._waits = deque(maxlen=window)
+        self._cond = threading.Condition()
+
+        self._threads = [threading.Thread(target=self._run, name='{}-{}'.format(name, i), daemon=True)
+                         for i in range(n_threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, message, deadline=None):
+        '''
+        queues fn(message, fast), deadline is a time.time() timestamp (None: no deadline)
+        returns a Future with the result
+        '''
+        future = Future()
+        queued = time.time()
+        due = queued + self.target_latency
+        if deadline is not None:
+            due = min(due, deadline)
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._ids), queued, deadline, fn, message, future))
+            self.stats['submitted'] += 1
+            self.stats['max_depth'] = max(self.stats['max_depth'], len(self._heap))
+            self._cond.notify()
+        return future
+
+    def depth(self):
+        return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, queued, deadline, fn, message, future = heapq.heappop(self._heap)
+                self._waits.append(time.time() - queued)
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            left = deadline - time.time() if deadline is not None else None
+            if left is not None and left < self.estimates['fast']:
+                self.stats['shed'] += 1
+                future.set_exception(DeadlineExpired('{:.1f}s left to answer'.format(left)))
+                continue
+
+            fast = left is not None and left < self.estimates['full']
+            start = time.perf_counter()
+            try:
+                res = fn(message, fast)
+            except Exception as e:
+                self.stats['errors'] += 1
+                future.set_exception(e)
+                continue
+
+            mode = 'fast' if fast else 'full'
+            self.estimates[mode] = 0.8 * self.estimates[mode] + 0.2 * (time.perf_counter() - start)
+            self.stats['answered'] += 1
+            self.stats['degraded'] += fast
+            future.set_result(res)
+
+    def metrics(self):
+        '''
+        queue depth, wait times (of the last window messages) and counters
+        '''
+        with self._cond:
+            waits = np.array(self._waits)
+            metrics = dict(self.stats, depth=len(self._heap))
+        metrics['estimates'] = dict(self.estimates)
+        metrics['wait_seconds'] = {'mean': float(waits.mean()), 'p50': float(np.percentile(waits, 50)),
+                                   'p95': float(np.percentile(waits, 95)), 'max': float(waits.max())} \
+            if len(waits) else None
+        return metrics
@@ -0,0 +1,66 @@
+import asyncio
+import functools
+import requests  # install the package via "pip install requests"
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SpeakeasyClient:
+    '''
+    client of the Speakeasy REST API
+    all calls share one keep-alive session with a connection pool of pool_size,
+    the async_* methods run the calls on a thread pool of the same size
+    so an event loop can poll rooms and post messages concurrently
+    '''
+
+    def __init__(self, url, pool_size=32, timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='speakeasy')
+
+    def _request(self, method, path, **kwargs):
+        return self.session.request(method, self.url + path, timeout=self.timeout, **kwargs).json()
+
+    # blocking calls
+
+    def login(self, username, password):
+        return self._request('POST', '/api/login', json={'username': username, 'password': password})
+
+    def rooms(self, session_token):
+        return self._request('GET', '/api/rooms', params={'session': session_token})
+
+    def room_state(self, room_id, since, session_token):
+        return self._request('GET', '/api/room/{}/{}'.format(room_id, since),
+                             params={'roomId': room_id, 'since': since, 'session': session_token})
+
+    def post_message(self, room_id, session_token, message):
+        return self._request('POST', '/api/room/{}'.format(room_id),
+                             params={'roomId': room_id, 'session': session_token}, data=message)
+
+    def logout(self, session_token):
+        return self._request('GET', '/api/logout', params={'session': session_token})
+
+    # asyncio versions
+
+    async def _run(self, call, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(call, *args))
+
+    async def async_rooms(self, session_token):
+        return await self._run(self.rooms, session_token)
+
+    async def async_room_state(self, room_id, since, session_token):
+        return await self._run(self.room_state, room_id, since, session_token)
+
+    async def async_post_message(self, room_id, session_token, message):
+        return await self._run(self.post_message, room_id, session_token, message)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,174 @@
+import sys
+import json
+import time
+import uuid
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class MockSpeakeasy:
+    '''
+    in memory stand in of the Speakeasy server, the rooms and messages of the endpoints the bot uses
+    rooms are opened and human messages posted directly (by the load generator),
+    every message keeps the perf_counter time it arrived for latency measurements
+    since_exclusive: /api/room/{id}/{since} returns the messages after since instead of from since on
+    reject_post(uid, message): True fails that post of the bot (500 response)
+    '''
+
+    def __init__(self, since_exclusive=False, bot_alias='Stefos', reject_post=None):
+        self.since_exclusive = since_exclusive
+        self.bot_alias = bot_alias
+        self.reject_post = reject_post
+
+        self.sessions = {}
+        self.rooms = {}
+        self.logged_in = threading.Event()
+        self.stats = {'requests': 0, 'polls': 0, 'posts': 0}
+        self._lock = threading.Lock()
+
+    def login(self, username):
+        token = uuid.uuid4().hex
+        with self._lock:
+            self.sessions[token] = username
+        self.logged_in.set()
+        return token
+
+    def logout(self, token):
+        with self._lock:
+            return self.sessions.pop(token, None) is not None
+
+    def open_room(self, seconds):
+        '''
+        opens a room that ends after seconds, returns its uid
+        '''
+        uid = uuid.uuid4().hex[:12]
+        with self._lock:
+            self.rooms[uid] = {'uid': uid, 'ends': time.time() + seconds, 'messages': []}
+        return uid
+
+    def add_message(self, uid, alias, text):
+        '''
+        appends a message to a room, returns it
+        '''
+        with self._lock:
+            messages = self.rooms[uid]['messages']
+            message = {'ordinal': len(messages), 'authorAlias': alias, 'message': text,
+                       'timeStamp': int(time.time() * 1000), 'reactions': [], 'time': time.perf_counter()}
+            messages.append(message)
+        return message
+
+    def clear_room(self, uid):
+        '''
+        drops the message history of a room, like a server reset
+        '''
+        with self._lock:
+            self.rooms[uid]['messages'] = []
+
+    def room_list(self):
+        now = time.time()
+        with self._lock:
+            return [{'uid': r['uid'], 'alias': self.bot_alias, 'prompt': '', 'startTime': 0,
+                     'remainingTime': max(0, int((r['ends'] - now) * 1000))} for r in self.rooms.values()]
+
+    def room_messages(self, uid, since):
+        with self._lock:
+            messages = self.rooms[uid]['messages']
+            start = since + 1 if self.since_exclusive else since
+            return [{k: v for k, v in m.items() if k != 'time'} for m in messages[max(start, 0):]]
+
+    def messages(self, uid):
+        '''
+        all messages of a room (with their arrival times)
+        '''
+        with self._lock:
+            return list(self.rooms[uid]['messages'])
+
+
+class SpeakeasyHandler(BaseHTTPRequestHandler):
+    # keep-alive, every response has a Content-Length
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body, status=200):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _route(self, method):
+        speakeasy = self.server.speakeasy
+        speakeasy.stats['requests'] += 1
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if method == 'POST' and parts == ['api', 'login']:
+            credentials = json.loads(self._body() or b'{}')
+            token = speakeasy.login(credentials.get('username', ''))
+            return self._reply({'sessionToken': token, 'userDetails': {'username': credentials.get('username', '')}})
+
+        body = self._body() if method == 'POST' else b''
+        if query.get('session') not in speakeasy.sessions:
+            return self._reply({'description': 'Unauthorized'}, 401)
+
+        if method == 'GET' and parts == ['api', 'logout']:
+            speakeasy.logout(query['session'])
+            return self._reply({'description': 'Logged out'})
+        if method == 'GET' and parts == ['api', 'rooms']:
+            return self._reply({'rooms': speakeasy.room_list()})
+        if len(parts) >= 3 and parts[:2] == ['api', 'room'] and parts[2] in speakeasy.rooms:
+            if method == 'GET' and len(parts) == 4:
+                speakeasy.stats['polls'] += 1
+                return self._reply({'roomId': parts[2], 'messages': speakeasy.room_messages(parts[2], int(parts[3]))})
+            if method == 'POST' and len(parts) == 3:
+                speakeasy.stats['posts'] += 1
+                message = body.decode('utf-8')
+                if speakeasy.reject_post is not None and speakeasy.reject_post(parts[2], message):
+                    return self._reply({'description': 'Message rejected'}, 500)
+                speakeasy.add_message(parts[2], speakeasy.bot_alias, message)
+                return self._reply({'description': 'Message received'})
+        return self._reply({'description': 'Not found'}, 404)
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+
+def serve(speakeasy, port=8000, host='localhost'):
+    '''
+    serves the mock on a background thread, returns the http server (shutdown() stops it)
+    '''
+    httpd = ThreadingHTTPServer((host, port), SpeakeasyHandler)
+    httpd.daemon_threads = True
+    httpd.speakeasy = speakeasy
+    threading.Thread(target=httpd.serve_forever, name='speakeasy-mock', daemon=True).start()
+    return httpd
+
+
+if __name__ == '__main__':
+    # python speakeasy_mock.py [port] [rooms] [room seconds]
+    # serves idle rooms, set url = 'http://localhost:<port>' in Stefos_agent.py to point the bot at it
+    # (python load_generator.py serves the mock and sends it questions)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    n_rooms = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 3600
+    speakeasy = MockSpeakeasy()
+    for _ in range(n_rooms):
+        speakeasy.open_room(seconds)
+    serve(speakeasy, port)
+    print('Mock Speakeasy on http://localhost:{} with {} rooms'.format(port, n_rooms))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
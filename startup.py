@@ -0,0 +1,118 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from startup_profiler import profile_section
+
+
+class StartupOrchestrator:
+    '''
+    loads the named resources of the bot concurrently on a thread pool
+    a resource is loaded with the results of its dependencies as arguments,
+    dependencies have to be added before the resources that need them
+    the bot is ready when all critical resources are loaded
+    '''
+
+    STATES = ('pending', 'loading', 'ready', 'failed')
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='startup')
+        self._futures = {}
+        self._critical = []
+        self._lock = threading.Lock()
+
+        self.states = {}
+        self.seconds = {}
+        self.started = time.perf_counter()
+
+    def add(self, name, load, deps=(), critical=True):
+        '''
+        schedules load(*dependency results), returns its future
+        '''
+        missing = [d for d in deps if d not in self._futures]
+        if missing:
+            raise ValueError('{} depends on resources that were not added: {}'.format(name, missing))
+
+        # dependencies were submitted earlier, so a worker never waits on a task queued behind it
+        dep_futures = [self._futures[d] for d in deps]
+        self.states[name] = 'pending'
+
+        def run():
+            try:
+                args = [f.result() for f in dep_futures]
+                self._set_state(name, 'loading')
+                start = time.perf_counter()
+                with profile_section(name):
+                    res = load(*args)
+            except Exception:
+                self._set_state(name, 'failed')
+                raise
+            self.seconds[name] = time.perf_counter() - start
+            self._set_state(name, 'ready')
+            return res
+
+        self._futures[name] = self._executor.submit(run)
+        if critical:
+            self._critical.append(name)
+        return self._futures[name]
+
+    def _set_state(self, name, state):
+        with self._lock:
+            self.states[name] = state
+
+    def get(self, name):
+        '''
+        result of a resource, blocks until it is loaded (raises if loading failed)
+        '''
+        return self._futures[name].result()
+
+    def is_ready(self):
+        return all(self._futures[name].done() and not self._futures[name].exception()
+                   for name in self._critical)
+
+    def wait_ready(self):
+        '''
+        blocks until every critical resource is loaded
+        raises the error of the first critical resource that failed
+        '''
+        for name in self._critical:
+            self._futures[name].result()
+        return time.perf_counter() - self.started
+
+    def report(self):
+        '''
+        state and load time of every resource
+        '''
+        with self._lock:
+            return {name: {'state': state, 'seconds': self.seconds.get(name)}
+                    for name, state in self.states.items()}
+
+
+class Lazy:
+    '''
+    a rarely used resource loaded on its first use
+    attribute access is passed on to the loaded object
+    '''
+
+    def __init__(self, load, name='resource'):
+        self._load = load
+        self._name = name
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._value is not None
+
+    def value(self):
+        '''
+        the loaded resource, loads it on the first call
+        '''
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    print('Loading {}...'.format(self._name))
+                    self._value = self._load()
+        return self._value
+
+    def __getattr__(self, attr):
+        return getattr(self.value(), attr)
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+
+def rss_bytes():
+    '''
+    resident set size of this process, None if it cannot be read (non Linux)
+    '''
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfiler:
+    '''
+    records wall time, CPU time (of the loading thread) and memory delta of every
+    profiled section, sections started inside another one record it as their parent
+    memory deltas are process wide, sections loading concurrently share them;
+    profile with one startup worker for exact per resource memory
+    disabled (no overhead) until enable() is called
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.tracemalloc_top = 0
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.perf_counter()
+
+    def enable(self, tracemalloc_top=0):
+        '''
+        tracemalloc_top > 0 also traces python allocations and reports the top N lines
+        '''
+        self.enabled = True
+        self.tracemalloc_top = tracemalloc_top
+        self.started = time.perf_counter()
+        if tracemalloc_top and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def section(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        parent = stack[-1] if stack else None
+        stack.append(name)
+
+        traced_before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        rss_before = rss_bytes()
+        cpu_before = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {'name': name,
+                      'parent': parent,
+                      'thread': threading.current_thread().name,
+                      'start': start - self.started,
+                      'wall_seconds': time.perf_counter() - start,
+                      'cpu_seconds': time.thread_time() - cpu_before}
+            rss_after = rss_bytes()
+            record['rss_delta_bytes'] = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            if traced_before is not None:
+                record['traced_delta_bytes'] = tracemalloc.get_traced_memory()[0] - traced_before
+            stack.pop()
+            with self._lock:
+                self.records.append(record)
+
+    def report(self):
+        '''
+        machine readable report of all sections (in the order they finished)
+        '''
+        with self._lock:
+            records = list(self.records)
+        report = {'wall_seconds': time.perf_counter() - self.started,
+                  'rss_bytes': rss_bytes(),
+                  'sections': records}
+        if self.tracemalloc_top and tracemalloc.is_tracing():
+            stats = tracemalloc.take_snapshot().statistics('lineno')[:self.tracemalloc_top]
+            report['tracemalloc_top'] = [{'where': str(stat.traceback), 'bytes': stat.size, 'count': stat.count}
+                                         for stat in stats]
+        return report
+
+    def save(self, path):
+        report = self.report()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def print_report(self, report=None):
+        report = report or self.report()
+        print('Startup profile ({:.1f}s):'.format(report['wall_seconds']))
+        for r in sorted(report['sections'], key=lambda r: -r['wall_seconds']):
+            mb = '{:9.1f}'.format(r['rss_delta_bytes'] / 2**20) if r['rss_delta_bytes'] is not None else '        ?'
+            print('\t{:<28} wall {:7.2f}s  cpu {:7.2f}s  rss {} MB'.format(
+                ('  ' if r['parent'] else '') + r['name'], r['wall_seconds'], r['cpu_seconds'], mb))
+
+
+# the profiler of this process, the loaders record their sections in it
+PROFILER = StartupProfiler()
+
+
+def profile_section(name):
+    '''
+    with profile_section('graph'): ... records the section when profiling is enabled
+    '''
+    return PROFILER.section(name)
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import atexit
+import asyncio
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speakeasy_mock import serve
+
+
+class StubPipeline:
+    '''
+    stands in for StefosPipeline: answers 'answer to <message>' after delays.get(message, delay) seconds
+    and records the calls and how many ran at the same time
+    '''
+
+    def __init__(self, delay=0.0, delays=None):
+        self.delay = delay
+        self.delays = delays or {}
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def create_response(self, message, fast=False):
+        with self._lock:
+            self.calls.append(message)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delays.get(message, self.delay))
+        with self._lock:
+            self.active -= 1
+        return 'answer to ' + message
+
+
+def answers(speakeasy, uid):
+    '''
+    posts of the bot in a room without the greeting and the '...' acknowledgements
+    '''
+    posts = [m['message'] for m in speakeasy.messages(uid) if m['authorAlias'] == speakeasy.bot_alias]
+    return [m for m in posts if m != '...' and not m.startswith('Hi, I am Stefos bot')]
+
+
+def listen_until(bot, done, timeout=10):
+    '''
+    runs the polling loop of the bot until done() or timeout seconds passed
+    '''
+    async def run():
+        task = asyncio.ensure_future(bot.listen_async())
+        end = time.monotonic() + timeout
+        while not done() and time.monotonic() < end:
+            await asyncio.sleep(0.02)
+        # let the last posts go out before the loop is stopped
+        await asyncio.sleep(0.1)
+        task.cancel()
+    asyncio.run(run())
+
+
+@pytest.fixture
+def make_bot(monkeypatch, tmp_path):
+    '''
+    make_bot(speakeasy, pipeline): a StefosBot logged in to the mock, answering with the pipeline
+    '''
+    Stefos_agent = pytest.importorskip('Stefos_agent')
+    bots, servers = [], []
+
+    def make(speakeasy, pipeline):
+        httpd = serve(speakeasy, 0)
+        servers.append(httpd)
+        monkeypatch.setattr(Stefos_agent, 'url', 'http://localhost:{}'.format(httpd.server_address[1]))
+        monkeypatch.setattr(Stefos_agent, 'listen_freq', 0.05)
+        monkeypatch.setattr(Stefos_agent, 'response_cache_path', None)
+        monkeypatch.setattr(Stefos_agent, 'metrics_path', str(tmp_path / 'metrics.json'))
+        bot = Stefos_agent.StefosBot('bot', 'password', pipeline=pipeline)
+        bots.append(bot)
+        return bot
+
+    yield make
+
+    for bot in bots:
+        for func in (bot.logout, bot.response_cache.save, bot.save_metrics):
+            atexit.unregister(func)
+        bot.client.close()
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
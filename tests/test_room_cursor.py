@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from speakeasy_mock import MockSpeakeasy
+from conftest import StubPipeline, answers, listen_until
+
+
+def poll(bot, uid):
+    return [m['message'] for m in asyncio.run(bot.poll_new_messages(uid))]
+
+
+@pytest.mark.parametrize('since_exclusive', [False, True])
+def test_every_message_is_returned_once(make_bot, since_exclusive):
+    speakeasy = MockSpeakeasy(since_exclusive=since_exclusive)
+    bot = make_bot(speakeasy, StubPipeline())
+    uid = speakeasy.open_room(60)
+
+    seen = []
+    for batch in (['a', 'b'], [], ['c'], ['d', 'e', 'f'], []):
+        for text in batch:
+            speakeasy.add_message(uid, 'user', text)
+        seen += poll(bot, uid)
+
+    assert seen == ['a', 'b', 'c', 'd', 'e', 'f']
+    assert bot.since_exclusive == since_exclusive
+
+
+def test_cursor_on_the_first_message_of_an_exclusive_server(make_bot):
+    speakeasy = MockSpeakeasy(since_exclusive=True)
+    bot = make_bot(speakeasy, StubPipeline())
+    uid = speakeasy.open_room(60)
+
+    speakeasy.add_message(uid, 'user', 'a')
+    assert poll(bot, uid) == ['a']
+    assert poll(bot, uid) == []
+    speakeasy.add_message(uid, 'user', 'b')
+    assert poll(bot, uid) == ['b']
+
+
+@pytest.mark.parametrize('since_exclusive', [False, True])
+def test_cleared_history_starts_over(make_bot, since_exclusive):
+    speakeasy = MockSpeakeasy(since_exclusive=since_exclusive)
+    bot = make_bot(speakeasy, StubPipeline())
+    uid = speakeasy.open_room(60)
+
+    for text in ('a', 'b', 'c'):
+        speakeasy.add_message(uid, 'user', text)
+    assert poll(bot, uid) == ['a', 'b', 'c']
+
+    speakeasy.clear_room(uid)
+    assert poll(bot, uid) == []
+    speakeasy.add_message(uid, 'user', 'd')
+    assert poll(bot, uid) == ['d']
+    assert poll(bot, uid) == []
+
+
+@pytest.mark.parametrize('since_exclusive', [False, True])
+def test_another_message_at_the_cursor_starts_over(make_bot, since_exclusive):
+    speakeasy = MockSpeakeasy(since_exclusive=since_exclusive)
+    bot = make_bot(speakeasy, StubPipeline())
+    uid = speakeasy.open_room(60)
+
+    for text in ('a', 'b'):
+        speakeasy.add_message(uid, 'user', text)
+    assert poll(bot, uid) == ['a', 'b']
+
+    # the new history reaches past the old cursor, its message at the cursor ordinal is another one
+    speakeasy.clear_room(uid)
+    for text in ('x', 'y', 'z'):
+        speakeasy.add_message(uid, 'user', text)
+    assert poll(bot, uid) == ['x', 'y', 'z']
+    assert poll(bot, uid) == []
+
+
+@pytest.mark.parametrize('since_exclusive', [False, True])
+def test_nothing_is_answered_twice_or_missed_across_a_reset(make_bot, since_exclusive):
+    speakeasy = MockSpeakeasy(since_exclusive=since_exclusive)
+    pipeline = StubPipeline()
+    bot = make_bot(speakeasy, pipeline)
+    uid = speakeasy.open_room(60)
+
+    speakeasy.add_message(uid, 'user', 'q1')
+    speakeasy.add_message(uid, 'user', 'q2')
+    listen_until(bot, lambda: len(answers(speakeasy, uid)) == 2)
+
+    speakeasy.clear_room(uid)
+    speakeasy.add_message(uid, 'user', 'q3')
+    listen_until(bot, lambda: answers(speakeasy, uid) == ['answer to q3'])
+
+    assert pipeline.calls == ['q1', 'q2', 'q3']
+    assert answers(speakeasy, uid) == ['answer to q3']
@@ -0,0 +1,68 @@
+from speakeasy_mock import MockSpeakeasy
+from conftest import StubPipeline, answers, listen_until
+
+
+def test_rooms_are_answered_concurrently(make_bot):
+    speakeasy = MockSpeakeasy()
+    pipeline = StubPipeline(delay=0.5)
+    bot = make_bot(speakeasy, pipeline)
+
+    rooms = [speakeasy.open_room(60) for _ in range(4)]
+    for i, uid in enumerate(rooms):
+        speakeasy.add_message(uid, 'user', 'question {}'.format(i))
+
+    listen_until(bot, lambda: all(answers(speakeasy, uid) for uid in rooms))
+
+    for i, uid in enumerate(rooms):
+        assert answers(speakeasy, uid) == ['answer to question {}'.format(i)]
+    assert pipeline.max_active > 1
+
+
+def test_answers_keep_the_order_of_the_questions(make_bot):
+    speakeasy = MockSpeakeasy()
+    # the first questions take longest
+    pipeline = StubPipeline(delays={'a1': 0.4, 'a2': 0.2, 'b1': 0.3})
+    bot = make_bot(speakeasy, pipeline)
+
+    room_a, room_b = speakeasy.open_room(60), speakeasy.open_room(60)
+    for text in ('a1', 'a2', 'a3'):
+        speakeasy.add_message(room_a, 'user', text)
+    for text in ('b1', 'b2'):
+        speakeasy.add_message(room_b, 'user', text)
+
+    listen_until(bot, lambda: len(answers(speakeasy, room_a)) == 3 and len(answers(speakeasy, room_b)) == 2)
+
+    assert answers(speakeasy, room_a) == ['answer to a1', 'answer to a2', 'answer to a3']
+    assert answers(speakeasy, room_b) == ['answer to b1', 'answer to b2']
+    # every acknowledgement comes before the answers of a room
+    posts = [m['message'] for m in speakeasy.messages(room_a) if m['authorAlias'] == speakeasy.bot_alias]
+    assert posts.index('...') < posts.index('answer to a1')
+
+
+def test_failed_post_does_not_block_later_posts(make_bot):
+    speakeasy = MockSpeakeasy(reject_post=lambda uid, message: message == 'answer to first')
+    bot = make_bot(speakeasy, StubPipeline())
+
+    uid = speakeasy.open_room(60)
+    speakeasy.add_message(uid, 'user', 'first')
+    speakeasy.add_message(uid, 'user', 'second')
+
+    listen_until(bot, lambda: answers(speakeasy, uid) == ['answer to second'])
+
+    assert answers(speakeasy, uid) == ['answer to second']
+    assert speakeasy.stats['posts'] >= 4
+
+
+def test_finished_rooms_are_not_polled(make_bot):
+    speakeasy = MockSpeakeasy()
+    pipeline = StubPipeline()
+    bot = make_bot(speakeasy, pipeline)
+
+    finished, open_room = speakeasy.open_room(0), speakeasy.open_room(60)
+    speakeasy.add_message(finished, 'user', 'too late')
+    speakeasy.add_message(open_room, 'user', 'in time')
+
+    listen_until(bot, lambda: answers(speakeasy, open_room))
+
+    assert pipeline.calls == ['in time']
+    assert speakeasy.messages(finished)[-1]['message'] == 'too late'
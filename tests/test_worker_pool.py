@@ -0,0 +1,44 @@
+import os
+import pytest
+from worker_pool import ResponseWorkerPool, WorkerCrashed
+
+
+def echo_factory():
+    return lambda message: 'answer to ' + message
+
+
+def failing_factory():
+    raise RuntimeError('model files missing')
+
+
+def crashing_factory():
+    # dies without an exception, like a worker killed while loading the models
+    os._exit(3)
+
+
+def test_tasks_are_answered_by_the_workers():
+    pool = ResponseWorkerPool(echo_factory, 2)
+    try:
+        assert pool.wait_ready(30)
+        futures = [pool.submit(str(i)) for i in range(5)]
+        assert [f.result(30) for f in futures] == ['answer to {}'.format(i) for i in range(5)]
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize('factory', [failing_factory, crashing_factory])
+def test_every_worker_failing_to_start_fails_the_tasks(factory):
+    pool = ResponseWorkerPool(factory, 2, max_retries=1)
+    # queued before the workers are given up
+    queued = pool.submit('queued')
+    try:
+        with pytest.raises(WorkerCrashed):
+            pool.wait_ready(60)
+        with pytest.raises(WorkerCrashed):
+            queued.result(5)
+        # the pool is dead, later tasks fail right away instead of never resolving
+        with pytest.raises(WorkerCrashed):
+            pool.submit('later').result(5)
+        assert pool.stats['restarts'] == 2
+    finally:
+        pool.close()
@@ -0,0 +1,7 @@
+def strip_end_punctuation(text):
+    '''
+    the NER models work on the message without its final ? or .
+    '''
+    if text and (text[-1] == '?' or text[-1] == '.'):
+        return text[:-1]
+    return text
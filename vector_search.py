@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+
+def _sq_norms(matrix, block_size=65536):
+    '''
+    squared L2 norm of every row, computed block by block
+    '''
+    res = np.empty(len(matrix), dtype=np.float32)
+    for lo in range(0, len(matrix), block_size):
+        block = np.asarray(matrix[lo:lo + block_size], dtype=np.float32)
+        res[lo:lo + block_size] = np.einsum('ij,ij->i', block, block)
+    return res
+
+
+def _top_k(dist, k):
+    '''
+    indices of the k smallest distances in ascending order
+    partial selection instead of a full argsort
+    '''
+    if k < len(dist):
+        idx = np.argpartition(dist, k)[:k]
+    else:
+        idx = np.arange(len(dist))
+    return idx[np.argsort(dist[idx], kind='stable')]
+
+
+class ExactSearch:
+    '''
+    exact euclidean nearest neighbour search
+    scans the matrix in blocks and keeps a partial top k per block,
+    gives the same results as pairwise_distances + argsort
+    '''
+
+    def __init__(self, matrix, block_size=65536):
+        self.matrix = matrix
+        self.block_size = block_size
+        self.norms = _sq_norms(matrix, block_size)
+
+    def search(self, query, k):
+        '''
+        returns (ids, distances) of the k nearest rows to query, nearest first
+        '''
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        q_norm = float(query @ query)
+
+        cand_ids = []
+        cand_dist = []
+        for lo in range(0, len(self.matrix), self.block_size):
+            block = np.asarray(self.matrix[lo:lo + self.block_size], dtype=np.float32)
+            # |x - q|^2 = |x|^2 - 2 x.q + |q|^2
+            dist = self.norms[lo:lo + len(block)] - 2 * (block @ query) + q_norm
+            best = _top_k(dist, k)
+            cand_ids.append(best + lo)
+            cand_dist.append(dist[best])
+
+        ids = np.concatenate(cand_ids)
+        dist = np.concatenate(cand_dist)
+        best = _top_k(dist, k)
+        return ids[best], np.sqrt(np.maximum(dist[best], 0))
+
+
+def _kmeans(data, nlist, iters=10, seed=0):
+    '''
+    plain Lloyd k-means used to train the IVF coarse quantizer
+    '''
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = _assign(data, centroids)
+        for c in range(nlist):
+            members = data[assign == c]
+            if len(members):
+                centroids[c] = members.mean(0)
+            else:
+                # reseed empty clusters on a random point
+                centroids[c] = data[rng.integers(len(data))]
+    return centroids
+
+
+def _assign(data, centroids, block_size=65536):
+    '''
+    index of the nearest centroid for every row of data
+    '''
+    c_norms = np.einsum('ij,ij->i', centroids, centroids)
+    res = np.empty(len(data), dtype=np.int64)
+    for lo in range(0, len(data), block_size):
+        block = np.asarray(data[lo:lo + block_size], dtype=np.float32)
+        res[lo:lo + block_size] = (c_norms - 2 * (block @ centroids.T)).argmin(1)
+    return res
+
+
+class IVFIndex:
+    '''
+    approximate nearest neighbour search with an inverted file index
+    rows are grouped under their nearest k-means centroid, a query only scans
+    the lists of its nprobe nearest centroids
+    nprobe is the recall / latency knob: higher finds more true neighbours but scans more rows
+    '''
+
+    def __init__(self, matrix, centroids, list_ids, list_offsets, nprobe=8):
+        self.matrix = matrix
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.list_ids = list_ids
+        self.list_offsets = list_offsets
+        self.nprobe = nprobe
+        self.norms = _sq_norms(matrix)
+        self.c_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+
+    @classmethod
+    def build(cls, matrix, nlist=None, iters=10, sample=100000, seed=0, nprobe=8):
+        '''
+        offline build: trains the centroids on a sample of the rows
+        and assigns every row to its list
+        '''
+        nlist = min(nlist or max(1, int(4 * np.sqrt(len(matrix)))), len(matrix), sample)
+        rng = np.random.default_rng(seed)
+        train_idx = np.sort(rng.choice(len(matrix), min(sample, len(matrix)), replace=False))
+        train = np.asarray(matrix[train_idx], dtype=np.float32)
+
+        centroids = _kmeans(train, nlist, iters, seed)
+        assign = _assign(matrix, centroids)
+
+        list_ids = np.argsort(assign, kind='stable')
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=list_offsets[1:])
+
+        return cls(matrix, centroids, list_ids, list_offsets, nprobe)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'centroids.npy'), self.centroids)
+        np.save(os.path.join(path, 'list_ids.npy'), self.list_ids)
+        np.save(os.path.join(path, 'list_offsets.npy'), self.list_offsets)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'type': 'ivf', 'rows': len(self.matrix), 'nlist': len(self.centroids),
+                       'nprobe': self.nprobe}, f)
+
+    @classmethod
+    def load(cls, matrix, path, nprobe=None):
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta['rows'] != len(matrix):
+            raise ValueError('Index in {} was built for {} rows, matrix has {}. Rebuild it with vector_search.py'
+                             .format(path, meta['rows'], len(matrix)))
+
+        return cls(matrix,
+                   np.load(os.path.join(path, 'centroids.npy')),
+                   np.load(os.path.join(path, 'list_ids.npy'), mmap_mode='r'),
+                   np.load(os.path.join(path, 'list_offsets.npy')),
+                   nprobe or meta['nprobe'])
+
+    def search(self, query, k, nprobe=None):
+        '''
+        returns (ids, distances) of the approximate k nearest rows to query, nearest first
+        '''
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+
+        probe = _top_k(self.c_norms - 2 * (self.centroids @ query), nprobe)
+        ids = np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe])
+        ids.sort()
+
+        cand = np.asarray(self.matrix[ids], dtype=np.float32)
+        dist = self.norms[ids] - 2 * (cand @ query) + float(query @ query)
+        best = _top_k(dist, k)
+        return ids[best], np.sqrt(np.maximum(dist[best], 0))
+
+
+def load_vector_index(matrix, path=None, nprobe=None):
+    '''
+    approximate index if one was built at path, exact search otherwise
+    '''
+    if path and os.path.exists(os.path.join(path, 'meta.json')):
+        return IVFIndex.load(matrix, path, nprobe)
+    return ExactSearch(matrix)
+
+
+def recall_at_k(index, exact, queries, k):
+    '''
+    fraction of the exact k nearest neighbours the index finds
+    along with the mean search time of both, used to tune nprobe
+    '''
+    hits = 0
+    t_index = t_exact = 0.0
+    for q in queries:
+        t0 = time.perf_counter()
+        approx, _ = index.search(q, k)
+        t1 = time.perf_counter()
+        truth, _ = exact.search(q, k)
+        t2 = time.perf_counter()
+        hits += len(set(approx.tolist()) & set(truth.tolist()))
+        t_index += t1 - t0
+        t_exact += t2 - t1
+
+    return {'recall': hits / (k * len(queries)),
+            'index_ms': 1000 * t_index / len(queries),
+            'exact_ms': 1000 * t_exact / len(queries)}
+
+
+if __name__ == '__main__':
+    # python vector_search.py embeds.npy out_dir [nlist] [nprobe]
+    emb_path, out_dir = sys.argv[1], sys.argv[2]
+    nlist = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    nprobe = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+
+    matrix = np.load(emb_path, mmap_mode='r')
+    print('Building IVF index over {} rows...'.format(len(matrix)))
+    index = IVFIndex.build(matrix, nlist=nlist, nprobe=nprobe)
+    index.save(out_dir)
+
+    rng = np.random.default_rng(1)
+    queries = np.asarray(matrix[rng.choice(len(matrix), min(100, len(matrix)), replace=False)])
+    exact = ExactSearch(matrix)
+    for p in sorted({1, nprobe // 2 or 1, nprobe, 2 * nprobe}):
+        index.nprobe = p
+        print('nprobe {}: {}'.format(p, recall_at_k(index, exact, queries, 10)))
+    print('Index written to {}'.format(out_dir))
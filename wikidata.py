@@ -0,0 +1,15 @@
+import rdflib
+
+
+WD = rdflib.Namespace('http://www.wikidata.org/entity/')
+WDT = rdflib.Namespace('http://www.wikidata.org/prop/direct/')
+
+
+def q_number(uri):
+    '''
+    Q number of a wikidata entity URI, None for anything else
+    '''
+    uri = str(uri)
+    if uri.startswith(WD) and uri[len(WD):len(WD) + 1] == 'Q' and uri[len(WD) + 1:].isdigit():
+        return int(uri[len(WD) + 1:])
+    return None
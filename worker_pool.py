@@ -0,0 +1,214 @@
+import itertools
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import wait as wait_connections
+from collections import deque
+from concurrent.futures import Future
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _worker_main(factory, conn):
+    '''
+    worker process: builds its responder with factory() and answers tasks until it gets None
+    '''
+    responder = factory()
+    conn.send(('ready', None, None))
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        task_id, args = task
+        try:
+            conn.send(('done', task_id, responder(*args)))
+        except Exception as e:
+            conn.send(('error', task_id, '{}: {}'.format(type(e).__name__, e)))
+
+
+class _Worker:
+    def __init__(self, ctx, factory, slot):
+        self.slot = slot
+        name = 'response-worker-{}'.format(slot)
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(factory, child_conn), name=name, daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.task = None
+
+
+class ResponseWorkerPool:
+    '''
+    runs a responder in n_workers processes, each built with factory()
+    (a picklable module level function returning the responder callable)
+    a coordinator thread hands the queued tasks to idle workers one at a time,
+    a worker that dies is replaced and its task retried up to max_retries times
+    large read only artifacts should be memory mapped so the workers share their pages
+    '''
+
+    def __init__(self, factory, n_workers, max_retries=1, start_method='spawn'):
+        self.factory = factory
+        self.max_retries = max_retries
+        self._ctx = mp.get_context(start_method)
+
+        self.stats = {'tasks': 0, 'errors': 0, 'crashes': 0, 'restarts': 0}
+
+        self._ids = itertools.count()
+        self._pending = deque()
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._closing = False
+        # set once no worker is left, new tasks fail right away
+        self._dead = None
+        self._wake_r, self._wake_w = self._ctx.Pipe(duplex=False)
+
+        # failed starts per worker slot
+        self._start_failures = [0] * n_workers
+        self._workers = [self._start_worker(i) for i in range(n_workers)]
+        self._thread = threading.Thread(target=self._run, name='response-pool', daemon=True)
+        self._thread.start()
+
+    def _start_worker(self, i):
+        return _Worker(self._ctx, self.factory, i)
+
+    def submit(self, *args):
+        '''
+        queues a task, returns a Future with the result of responder(*args)
+        (failed with WorkerCrashed if no worker is left)
+        '''
+        future = Future()
+        with self._lock:
+            if self._dead is not None:
+                future.set_exception(WorkerCrashed(self._dead))
+                return future
+            task_id = next(self._ids)
+            self._futures[task_id] = [future, args, 0]
+            self._pending.append(task_id)
+        self._wake_w.send_bytes(b'')
+        return future
+
+    def respond(self, *args):
+        return self.submit(*args).result()
+
+    def wait_ready(self, timeout=None):
+        '''
+        blocks until every worker built its responder
+        raises WorkerCrashed if no worker could be started
+        '''
+        ready = self._ready.wait(timeout)
+        if not self._workers:
+            raise WorkerCrashed('no response worker could be started')
+        return ready
+
+    def close(self):
+        '''
+        stops the workers (after their current task)
+        '''
+        self._closing = True
+        for worker in list(self._workers):
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in list(self._workers):
+            worker.process.join(timeout=5)
+
+    def _run(self):
+        while self._workers and not self._closing:
+            conns = {w.conn: w for w in self._workers}
+            sentinels = {w.process.sentinel: w for w in self._workers}
+            for ready in wait_connections(list(conns) + list(sentinels) + [self._wake_r]):
+                if ready is self._wake_r:
+                    self._wake_r.recv_bytes()
+                elif ready in conns:
+                    self._receive(conns[ready])
+                else:
+                    self._restart(sentinels[ready])
+            self._dispatch()
+
+    def _receive(self, worker):
+        try:
+            kind, task_id, value = worker.conn.recv()
+        except (EOFError, OSError):
+            # the process died, its sentinel restarts it
+            return
+
+        if kind == 'ready':
+            worker.ready = True
+            if all(w.ready for w in self._workers):
+                self._ready.set()
+            return
+
+        worker.task = None
+        with self._lock:
+            future = self._futures.pop(task_id)[0]
+        self.stats['tasks'] += 1
+        if kind == 'done':
+            future.set_result(value)
+        else:
+            self.stats['errors'] += 1
+            future.set_exception(RuntimeError(value))
+
+    def _restart(self, worker):
+        '''
+        replaces a dead worker, its task is queued again (first) or failed after max_retries
+        a worker that dies while building its responder is started again up to max_retries times,
+        then given up (it would keep failing)
+        '''
+        worker.process.join()
+        worker.conn.close()
+        if self._closing:
+            return
+        self.stats['crashes'] += 1
+
+        i = self._workers.index(worker)
+        if not worker.ready:
+            print('\t\t Error: {} failed to start (exit code {})'.format(worker.process.name, worker.process.exitcode))
+            self._start_failures[worker.slot] += 1
+            if self._start_failures[worker.slot] <= self.max_retries:
+                self._workers[i] = self._start_worker(worker.slot)
+                self.stats['restarts'] += 1
+                return
+            self._workers.remove(worker)
+            if not self._workers:
+                # the coordinator stops, the queued and the later tasks fail instead of waiting forever
+                with self._lock:
+                    self._dead = 'no response worker could be started'
+                    for future, _, _ in self._futures.values():
+                        future.set_exception(WorkerCrashed(self._dead))
+                    self._futures.clear()
+                    self._pending.clear()
+                self._ready.set()
+            elif all(w.ready for w in self._workers):
+                self._ready.set()
+            return
+
+        print('\t\t Error: {} died (exit code {}), restarting it'.format(worker.process.name, worker.process.exitcode))
+
+        if worker.task is not None:
+            with self._lock:
+                entry = self._futures[worker.task]
+                entry[2] += 1
+                if entry[2] > self.max_retries:
+                    del self._futures[worker.task]
+                    entry[0].set_exception(WorkerCrashed('worker died {} times on this task'.format(entry[2])))
+                else:
+                    self._pending.appendleft(worker.task)
+
+        self._workers[i] = self._start_worker(worker.slot)
+        self.stats['restarts'] += 1
+
+    def _dispatch(self):
+        for worker in self._workers:
+            if not worker.ready or worker.task is not None:
+                continue
+            with self._lock:
+                if not self._pending:
+                    return
+                task_id = self._pending.popleft()
+                args = self._futures[task_id][1]
+            worker.task = task_id
+            worker.conn.send((task_id, args))